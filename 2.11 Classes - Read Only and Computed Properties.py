@@ -217,3 +217,1093 @@ for url in urls:
 # https://www.python.org 	size=49_132 	elapsed=0.18 secs
 # https://www.yahoo.com 	size=524_548 	elapsed=0.77 secs
 # =============================================================================
+
+# =============================================================================
+# Downloading Many Pages Concurrently
+# Our WebPage downloads one page at a time: download_page blocks inside urlopen until the whole page has arrived, and the loop over the urls above is completely serial - most of the elapsed time is spent just waiting on the network.
+#
+# With asyncio we can have many downloads in flight at the same time, in a single thread. The standard library does not include an asyncio HTTP client (that's what 3rd party libraries like aiohttp or httpx are for), but a minimal HTTP/1.1 GET over asyncio.open_connection is not a lot of code, and lets us:
+# - bound the number of concurrent downloads with an asyncio.Semaphore
+# - keep connections alive after a download, in a pool keyed by (scheme, host, port), and reuse them for the next url on the same server - instead of paying for a new TCP (and TLS) handshake every time
+#
+# To keep the same lazy semantics, AsyncWebPage is a subclass of WebPage: page, page_size and time_elapsed still only trigger a download when they are first requested. A WebPageBatch groups many pages together, and the first time any page in the batch needs downloading, the whole batch (every page not downloaded yet) is downloaded concurrently. If some of the downloads fail, the others still complete - each failed page keeps its own exception, and raises it when one of its properties is requested.
+#
+# The lazy properties use asyncio.run to run the downloads, and that's not allowed from inside an event loop that is already running (in a coroutine, or in a Jupyter notebook, which runs one for us) - there we have to await batch.download_async() (or page.download_page_async(pool)) ourselves instead.
+#
+# Our minimal client only supports what it needs to: a response body is delimited by Content-Length, by chunked transfer encoding, or by the server closing the connection. Responses that can't have a body (1xx, 204 and 304 responses, and responses to HEAD requests) have none - we must not wait for one.
+# =============================================================================
+
+import asyncio
+import ssl
+import urllib.error
+from time import perf_counter
+from urllib.parse import urljoin, urlsplit
+
+class ConnectionPool:
+    def __init__(self):
+        self._idle = {}  # (scheme, host, port) -> list of idle (reader, writer) pairs
+        self.connections_opened = 0
+
+    async def acquire(self, scheme, host, port):
+        idle = self._idle.get((scheme, host, port))
+        while idle:
+            reader, writer = idle.pop()
+            if not reader.at_eof() and not writer.is_closing():
+                return reader, writer, True
+            writer.close()
+        ssl_context = ssl.create_default_context() if scheme == 'https' else None
+        reader, writer = await asyncio.open_connection(host, port, ssl=ssl_context)
+        self.connections_opened += 1
+        return reader, writer, False
+
+    def release(self, scheme, host, port, reader, writer):
+        self._idle.setdefault((scheme, host, port), []).append((reader, writer))
+
+    def close(self):
+        for connections in self._idle.values():
+            for _, writer in connections:
+                writer.close()
+        self._idle.clear()
+
+async def _read_headers(reader):
+    status_line = await reader.readline()
+    if not status_line:
+        raise ConnectionResetError('Connection closed by server')
+    version, status, *reason = status_line.decode('latin-1').split(' ', 2)
+    headers = {}
+    while True:
+        line = await reader.readline()
+        if line in (b'\r\n', b'\n', b''):
+            break
+        name, _, value = line.decode('latin-1').partition(':')
+        headers[name.strip().lower()] = value.strip()
+    return version, int(status), ''.join(reason).strip(), headers
+
+async def _read_body(reader, status, headers, version, method):
+    # returns the body, and whether the connection can be reused afterwards
+    connection = headers.get('connection', '').lower()
+    if version == 'HTTP/1.0':
+        keep_alive = connection == 'keep-alive'
+    else:
+        keep_alive = connection != 'close'
+    if method == 'HEAD' or 100 <= status < 200 or status in (204, 304):
+        # these responses never have a body, whatever their headers say
+        return b'', keep_alive
+    if headers.get('transfer-encoding', '').lower() == 'chunked':
+        chunks = []
+        while True:
+            size = int((await reader.readline()).split(b';')[0], 16)
+            if size == 0:
+                # skip any trailer headers
+                while (await reader.readline()) not in (b'\r\n', b'\n', b''):
+                    pass
+                break
+            chunks.append(await reader.readexactly(size))
+            await reader.readexactly(2)  # the \r\n after each chunk
+        body = b''.join(chunks)
+    elif 'content-length' in headers:
+        body = await reader.readexactly(int(headers['content-length']))
+    elif not keep_alive:
+        # the body ends when the server closes the connection
+        return await reader.read(), False
+    else:
+        raise urllib.error.URLError('Cannot tell where the response body ends '
+                                    '(no Content-Length, not chunked, and the connection is kept alive)')
+    return body, keep_alive
+
+async def _get(pool, url, max_redirects=5):
+    for _ in range(max_redirects + 1):
+        parts = urlsplit(url)
+        scheme, host = parts.scheme, parts.hostname
+        port = parts.port or (443 if scheme == 'https' else 80)
+        path = parts.path or '/'
+        if parts.query:
+            path += '?' + parts.query
+        request = (
+            f'GET {path} HTTP/1.1\r\n'
+            f'Host: {parts.netloc}\r\n'
+            'User-Agent: Python-AsyncWebPage\r\n'
+            'Accept-Encoding: identity\r\n'
+            'Connection: keep-alive\r\n\r\n'
+        ).encode('latin-1')
+
+        reader, writer, reused = await pool.acquire(scheme, host, port)
+        try:
+            writer.write(request)
+            await writer.drain()
+            version, status, reason, headers = await _read_headers(reader)
+            body, keep_alive = await _read_body(reader, status, headers, version, 'GET')
+        except (ConnectionError, asyncio.IncompleteReadError):
+            writer.close()
+            if not reused:
+                raise
+            # the server closed an idle pooled connection - retry on a fresh one
+            continue
+        except BaseException:
+            writer.close()
+            raise
+        if keep_alive:
+            pool.release(scheme, host, port, reader, writer)
+        else:
+            writer.close()
+
+        if status in (301, 302, 303, 307, 308) and 'location' in headers:
+            url = urljoin(url, headers['location'])
+            continue
+        if status >= 400:
+            raise urllib.error.HTTPError(url, status, reason, None, None)
+        return body
+    raise urllib.error.URLError(f'Too many redirects for {url}')
+
+def _run(make_coroutine, alternative):
+    # asyncio.run can't be called from inside a running event loop
+    try:
+        asyncio.get_running_loop()
+    except RuntimeError:
+        return asyncio.run(make_coroutine())
+    raise RuntimeError(f'An event loop is already running in this thread - use {alternative} instead.')
+
+class AsyncWebPage(WebPage):
+    def __init__(self, url, batch=None):
+        super().__init__(url)
+        self._batch = batch
+
+    @WebPage.url.setter
+    def url(self, value):
+        WebPage.url.fset(self, value)
+        # the exception a failed batch download left for this page
+        self._error = None
+
+    def download_page(self):
+        # called (through the lazy properties) when the page is needed and not downloaded yet
+        if self._batch is not None:
+            if self._error is None:
+                self._batch.download()
+            if self._error is not None:
+                raise self._error
+        else:
+            _run(self._download_alone, 'await page.download_page_async(pool)')
+
+    async def _download_alone(self):
+        pool = ConnectionPool()
+        try:
+            await self.download_page_async(pool)
+        finally:
+            pool.close()
+
+    async def download_page_async(self, pool):
+        self._page_size = None
+        self._load_time_secs = None
+        start_time = perf_counter()
+        page = await _get(pool, self.url)
+        end_time = perf_counter()
+
+        self._page = page
+        self._page_size = len(page)
+        self._load_time_secs = end_time - start_time
+
+class WebPageBatch:
+    def __init__(self, urls, max_concurrency=10):
+        self.max_concurrency = max_concurrency
+        self.pool = ConnectionPool()
+        self.pages = [AsyncWebPage(url, batch=self) for url in urls]
+
+    def __iter__(self):
+        return iter(self.pages)
+
+    def __len__(self):
+        return len(self.pages)
+
+    def download(self):
+        _run(self.download_async, 'await batch.download_async()')
+
+    async def download_async(self):
+        semaphore = asyncio.Semaphore(self.max_concurrency)
+
+        async def download(page):
+            async with semaphore:
+                await page.download_page_async(self.pool)
+
+        pending = [page for page in self.pages if page._page is None and page._error is None]
+        try:
+            results = await asyncio.gather(*(download(page) for page in pending), return_exceptions=True)
+        finally:
+            # pooled connections belong to this event loop - close them when it's done
+            self.pool.close()
+        for page, result in zip(pending, results):
+            if isinstance(result, Exception):
+                page._error = result
+            elif isinstance(result, BaseException):
+                # not a failed download (KeyboardInterrupt, cancellation, ...) - don't swallow it
+                raise result
+#Since we want to be able to test this without depending on external web sites (and their response times), let's write a small helper that starts a local stand-in HTTP server in a background thread (we'll use it again in the next few sections - and shut each server down once we're done with it):
+
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from time import sleep
+
+def start_stand_in_server(handler_class):
+    # returns the server (call shutdown() and server_close() when done), and its base url
+    server = ThreadingHTTPServer(('127.0.0.1', 0), handler_class)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server, f'http://127.0.0.1:{server.server_port}'
+#Our first server supports keep-alive connections (HTTP/1.1), returns a page of size n for the path /n (and a 204 No Content response for /empty, or a 404 for anything else), and waits a little before responding, to simulate network latency:
+
+class StandInHandler(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'
+
+    def do_GET(self):
+        sleep(0.1)
+        path = self.path.strip('/')
+        if path == 'empty':
+            self.send_response(204)
+            self.end_headers()
+            return
+        if not path.isdigit():
+            self.send_error(404)
+            return
+        body = b'x' * int(path)
+        self.send_response(200)
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, *args):
+        pass
+
+server, base_url = start_stand_in_server(StandInHandler)
+#A single AsyncWebPage works just like a WebPage:
+
+page = AsyncWebPage(f'{base_url}/1000')
+page.page_size, round(page.time_elapsed, 1)
+#(1000, 0.1)
+#Now let's download 50 pages, at most 10 at a time:
+
+urls = [f'{base_url}/{n}' for n in range(1_000, 51_000, 1_000)]
+batch = WebPageBatch(urls, max_concurrency=10)
+start = perf_counter()
+sizes = [page.page_size for page in batch]
+print(f'elapsed={perf_counter() - start:.2f} secs, connections opened={batch.pool.connections_opened}')
+#elapsed=0.69 secs, connections opened=10
+sizes[:3], sizes[-1]
+#([1000, 2000, 3000], 50000)
+#Accessing the first page_size downloaded the entire batch, 10 pages at a time - so 50 pages took a little over 5 x 0.1 seconds, and only 10 connections were needed, since they were reused. Downloading them one at a time with WebPage takes about 50 x 0.1 seconds:
+
+import urllib.request
+
+start = perf_counter()
+sizes = [WebPage(url).page_size for url in urls]
+print(f'elapsed={perf_counter() - start:.2f} secs')
+#elapsed=5.12 secs
+#If some downloads fail, the rest of the batch still gets downloaded - the failed page raises its own exception when we need it. And an empty (204) response does not leave us waiting for a body that will never come:
+
+batch = WebPageBatch([f'{base_url}/10', f'{base_url}/missing', f'{base_url}/empty'])
+batch.pages[0].page_size, batch.pages[2].page_size
+#(10, 0)
+try:
+    batch.pages[1].page_size
+except urllib.error.HTTPError as ex:
+    print(ex)
+#HTTP Error 404: Not Found
+#From inside a running event loop, the lazy properties can't start one of their own - so we await the downloads instead:
+
+async def main():
+    batch = WebPageBatch(urls[:3])
+    try:
+        batch.pages[0].page_size
+    except RuntimeError as ex:
+        print(ex)
+    await batch.download_async()
+    return [page.page_size for page in batch]
+
+asyncio.run(main())
+#An event loop is already running in this thread - use await batch.download_async() instead.
+#[1000, 2000, 3000]
+server.shutdown()
+server.server_close()
+
+
+# =============================================================================
+# Caching Responses
+# Every new WebPage (and every time we set the url) clears _page, so the whole page gets downloaded again - even if it has not changed at all since the last time we downloaded it.
+#
+# HTTP has a mechanism for exactly this: when a server sends a page, it can include an ETag (a version identifier for the content) and/or a Last-Modified header. The next time we ask for that page, we can send those values back in If-None-Match / If-Modified-Since headers (a "conditional GET"), and if the page has not changed, the server answers with a short 304 Not Modified response, without sending the body again.
+#
+# So let's give WebPage a pluggable response cache. Any object with get(url) and put(url, response) methods will do - we'll write two of them:
+# - MemoryResponseCache keeps responses in an OrderedDict, in least recently used order, and evicts the least recently used ones once the total size of the cached bodies goes over max_bytes
+# - DiskResponseCache does the same with files in a directory (using the file modification times to track the least recently used ones), so the cache survives restarts and can be shared between processes
+#
+# Since other processes may be reading the disk cache while we write to it (or evicting the very file we are reading), each response is stored in a single file (a line of JSON metadata, followed by the body), that is written under a temporary name and then renamed into place with os.replace - a reader either sees the complete old file, the complete new one, or no file at all (a cache miss). To avoid scanning the whole directory on every put, the cache keeps a running total of the size of its files, and only scans the directory (to find the least recently used files) when that total goes over max_bytes.
+#
+# When the server answers 304, download_page uses the cached body, and only time_elapsed gets refreshed (the round trip for the 304).
+#
+# We'll also move the actual request into an _open method, that download_page calls with the (conditional) request headers - that gives subclasses a single place to change how requests are made.
+# =============================================================================
+
+import hashlib
+import json
+import os
+import tempfile
+import urllib.error
+import urllib.request
+from collections import OrderedDict, namedtuple
+from time import perf_counter
+
+CachedResponse = namedtuple('CachedResponse', 'body etag last_modified')
+
+class MemoryResponseCache:
+    def __init__(self, max_bytes=64 * 1024 ** 2):
+        self.max_bytes = max_bytes
+        self._responses = OrderedDict()
+        self._size = 0
+
+    def get(self, url):
+        response = self._responses.get(url)
+        if response is not None:
+            self._responses.move_to_end(url)
+        return response
+
+    def put(self, url, response):
+        old = self._responses.pop(url, None)
+        if old is not None:
+            self._size -= len(old.body)
+        if len(response.body) > self.max_bytes:
+            return
+        self._responses[url] = response
+        self._size += len(response.body)
+        while self._size > self.max_bytes:
+            _, evicted = self._responses.popitem(last=False)
+            self._size -= len(evicted.body)
+
+class DiskResponseCache:
+    def __init__(self, directory, max_bytes=1024 ** 3):
+        self.directory = directory
+        self.max_bytes = max_bytes
+        os.makedirs(directory, exist_ok=True)
+        # the total size of the cache files - kept up to date as we add files, and re-synced
+        # (with whatever other processes did in the meantime) whenever we evict
+        self._size = sum(size for _, size, _ in self._entries())
+
+    def _path(self, url):
+        return os.path.join(self.directory, hashlib.sha256(url.encode()).hexdigest() + '.cache')
+
+    def _entries(self):
+        # (last used time, size, path) of every cache file
+        entries = []
+        for entry in os.scandir(self.directory):
+            if entry.name.endswith('.cache'):
+                try:
+                    stat = entry.stat()
+                except FileNotFoundError:
+                    continue  # evicted (or replaced) by someone else, while we were scanning
+                entries.append((stat.st_mtime, stat.st_size, entry.path))
+        return entries
+
+    def get(self, url):
+        path = self._path(url)
+        try:
+            with open(path, 'rb') as f:
+                meta = json.loads(f.readline())
+                body = f.read()
+        except FileNotFoundError:
+            return None
+        except ValueError:
+            # not a file we wrote - treat it as a miss
+            return None
+        try:
+            os.utime(path)  # mark as recently used
+        except FileNotFoundError:
+            pass  # evicted since we read it - what we read is still a complete response
+        return CachedResponse(body, meta['etag'], meta['last_modified'])
+
+    def put(self, url, response):
+        meta = json.dumps({'url': url, 'etag': response.etag, 'last_modified': response.last_modified})
+        size = len(meta) + 1 + len(response.body)
+        if size > self.max_bytes:
+            return
+        path = self._path(url)
+        fd, temp_path = tempfile.mkstemp(dir=self.directory, suffix='.tmp')
+        try:
+            with os.fdopen(fd, 'wb') as f:
+                f.write(meta.encode() + b'\n')
+                f.write(response.body)
+            try:
+                self._size -= os.stat(path).st_size
+            except FileNotFoundError:
+                pass
+            os.replace(temp_path, path)
+        except BaseException:
+            os.remove(temp_path)
+            raise
+        self._size += size
+        if self._size > self.max_bytes:
+            self._evict()
+
+    def _evict(self):
+        entries = self._entries()
+        total = sum(size for _, size, _ in entries)
+        for _, size, path in sorted(entries):
+            if total <= self.max_bytes:
+                break
+            try:
+                os.remove(path)
+            except FileNotFoundError:
+                pass
+            total -= size
+        self._size = total
+
+class WebPage:
+    def __init__(self, url, cache=None):
+        self.cache = cache
+        self.url = url
+        self._page = None
+        self._load_time_secs = None
+        self._page_size = None
+        self.not_modified = False
+
+    @property
+    def url(self):
+        return self._url
+
+    @url.setter
+    def url(self, value):
+        self._url = value
+        self._page = None
+        # we'll lazy load the page - i.e. we wait until some property is requested
+
+    @property
+    def page(self):
+        if self._page is None:
+            self.download_page()
+        return self._page
+
+    @property
+    def page_size(self):
+        if self._page is None:
+            # need to first download the page
+            self.download_page()
+        return self._page_size
+
+    @property
+    def time_elapsed(self):
+        if self._page is None:
+            self.download_page()
+        return self._load_time_secs
+
+    @staticmethod
+    def _conditional_headers(cached):
+        headers = {}
+        if cached is not None:
+            if cached.etag:
+                headers['If-None-Match'] = cached.etag
+            if cached.last_modified:
+                headers['If-Modified-Since'] = cached.last_modified
+        return headers
+
+    def _open(self, headers, method='GET'):
+        # raises HTTPError for anything but a 2xx response (including 304 Not Modified), just like urlopen
+        return urllib.request.urlopen(urllib.request.Request(self.url, headers=headers, method=method))
+
+    def download_page(self):
+        self._page_size = None
+        self._load_time_secs = None
+        cached = self.cache.get(self.url) if self.cache is not None else None
+
+        start_time = perf_counter()
+        try:
+            with self._open(self._conditional_headers(cached)) as f:
+                page = f.read()
+                etag, last_modified = f.headers.get('ETag'), f.headers.get('Last-Modified')
+            self.not_modified = False
+        except urllib.error.HTTPError as ex:
+            if ex.code != 304 or cached is None:
+                raise
+            # not modified - the cached body is still valid
+            page = cached.body
+            self.not_modified = True
+        end_time = perf_counter()
+
+        if self.cache is not None and not self.not_modified and (etag or last_modified):
+            self.cache.put(self.url, CachedResponse(page, etag, last_modified))
+        self._page = page
+        self._page_size = len(page)
+        self._load_time_secs = end_time - start_time
+#Let's try this against a local stand-in server that supports ETags, and counts how many bytes of page bodies it actually sent:
+
+class ETagHandler(BaseHTTPRequestHandler):
+    pages = {'/a': b'a' * 100_000, '/b': b'b' * 200_000}
+    body_bytes_sent = 0
+
+    def do_GET(self):
+        body = self.pages[self.path]
+        etag = '"' + hashlib.sha1(body).hexdigest() + '"'
+        if self.headers.get('If-None-Match') == etag:
+            self.send_response(304)
+            self.send_header('ETag', etag)
+            self.end_headers()
+            return
+        self.send_response(200)
+        self.send_header('ETag', etag)
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        # counted before sending, so the count is up to date as soon as the client has the page
+        ETagHandler.body_bytes_sent += len(body)
+        self.wfile.write(body)
+
+    def log_message(self, *args):
+        pass
+
+server, base_url = start_stand_in_server(ETagHandler)
+
+cache = MemoryResponseCache(max_bytes=1024 ** 2)
+page = WebPage(f'{base_url}/a', cache=cache)
+page.page_size, page.not_modified, ETagHandler.body_bytes_sent
+#(100000, False, 100000)
+page = WebPage(f'{base_url}/a', cache=cache)
+page.page_size, page.not_modified, ETagHandler.body_bytes_sent
+#(100000, True, 100000)
+#The second page got its body from the cache - the server only had to send a 304. The same happens when we re-assign the url:
+
+page.url = f'{base_url}/a'
+page.page_size, page.not_modified, ETagHandler.body_bytes_sent
+#(100000, True, 100000)
+#If the page changes on the server, the ETag no longer matches, so the new page is downloaded (and cached):
+
+ETagHandler.pages['/a'] = b'A' * 150_000
+page = WebPage(f'{base_url}/a', cache=cache)
+page.page_size, page.not_modified, ETagHandler.body_bytes_sent
+#(150000, False, 250000)
+#With a size bound of 300,000 bytes, caching /b evicts the least recently used entry:
+
+small_cache = MemoryResponseCache(max_bytes=300_000)
+WebPage(f'{base_url}/a', cache=small_cache).page_size
+#150000
+WebPage(f'{base_url}/b', cache=small_cache).page_size
+#200000
+small_cache.get(f'{base_url}/a'), len(small_cache.get(f'{base_url}/b').body)
+#(None, 200000)
+#The disk cache works the same way, and keeps working across processes (or restarts):
+
+cache_dir = tempfile.TemporaryDirectory()
+disk_cache = DiskResponseCache(cache_dir.name)
+WebPage(f'{base_url}/b', cache=disk_cache).page_size
+#200000
+page = WebPage(f'{base_url}/b', cache=DiskResponseCache(disk_cache.directory))
+page.page_size, page.not_modified
+#(200000, True)
+#With room for just one of the pages, caching /a evicts /b (the least recently used file) - and only leaves complete cache files behind:
+
+small_disk_cache = DiskResponseCache(disk_cache.directory, max_bytes=300_000)
+WebPage(f'{base_url}/a', cache=small_disk_cache).page_size
+#150000
+small_disk_cache.get(f'{base_url}/b'), len(small_disk_cache.get(f'{base_url}/a').body), os.listdir(cache_dir.name) == [os.path.basename(small_disk_cache._path(f'{base_url}/a'))]
+#(None, 150000, True)
+server.shutdown()
+server.server_close()
+cache_dir.cleanup()
+
+
+# =============================================================================
+# Streaming Downloads
+# To compute page_size, download_page reads the entire page into memory with f.read(), and keeps it in _page - even if all we wanted was the size of the page and how long it took to download. For a 500 MB resource, that's 500 MB of memory, just to call len() on it.
+#
+# Instead, we can read the response in fixed-size chunks, count the bytes as they go by, and only keep the chunks if we actually need the page itself. While the chunks go by, we can also feed them to a hash (hashlib) and/or to a callback (to write them to a file, for example) - so we get a checksum of the page without ever holding all of it.
+#
+# In streaming mode:
+# - page_size first asks the server for the size with a HEAD request - if the response has a Content-Length header, we don't need to download the page at all
+# - if not, or if we ask for time_elapsed (or digest), the page is streamed through a single reusable buffer, and then discarded
+# - only page downloads (and keeps) the full body
+#
+# StreamingWebPage extends the WebPage we just wrote (with its response cache), rather than replacing it - with stream=False (the default) it works just like before. In streaming mode, the cache is still used: a 304 Not Modified response is served from the cached body, but a body we streamed and threw away can't be cached, so only downloads that keep the body (page) are stored in the cache.
+#
+# The streaming download goes through the same _open method as the regular one, so it sends the same conditional request headers.
+# =============================================================================
+
+import hashlib
+import urllib.error
+from time import perf_counter
+
+class StreamingWebPage(WebPage):
+    def __init__(self, url, cache=None, stream=False, chunk_size=64 * 1024, hash_name=None, callback=None):
+        self.stream = stream
+        self.chunk_size = chunk_size
+        self.hash_name = hash_name
+        self.callback = callback
+        super().__init__(url, cache=cache)
+
+    @WebPage.url.setter
+    def url(self, value):
+        WebPage.url.fset(self, value)
+        self._page_size = None
+        self._load_time_secs = None
+        self._digest = None
+
+    @property
+    def page_size(self):
+        if not self.stream:
+            return super().page_size
+        if self._page_size is None:
+            self._page_size = self.content_length()
+        if self._page_size is None:
+            # need to first download (and count) the page
+            self.download_page(keep_body=False)
+        return self._page_size
+
+    @property
+    def time_elapsed(self):
+        if not self.stream:
+            return super().time_elapsed
+        if self._load_time_secs is None:
+            self.download_page(keep_body=False)
+        return self._load_time_secs
+
+    @property
+    def digest(self):
+        if self.hash_name is None:
+            return None
+        if self._digest is None:
+            self.download_page(keep_body=not self.stream)
+        return self._digest
+
+    def content_length(self):
+        # the size the server reports for the page, without downloading it (None if unknown)
+        try:
+            with self._open({}, method='HEAD') as f:
+                length = f.headers.get('Content-Length')
+        except urllib.error.HTTPError:
+            # some servers don't allow HEAD requests
+            return None
+        return int(length) if length is not None else None
+
+    def download_page(self, keep_body=True):
+        self._page_size = None
+        self._load_time_secs = None
+        cached = self.cache.get(self.url) if self.cache is not None else None
+        hasher = hashlib.new(self.hash_name) if self.hash_name else None
+        chunks = [] if keep_body else None
+        buffer = bytearray(self.chunk_size)
+        view = memoryview(buffer)
+        size = 0
+
+        def consume(chunk):
+            if hasher is not None:
+                hasher.update(chunk)
+            if self.callback is not None:
+                # the chunk is only valid during the call - the buffer gets reused
+                self.callback(chunk)
+            if chunks is not None:
+                chunks.append(bytes(chunk))
+
+        start_time = perf_counter()
+        try:
+            with self._open(self._conditional_headers(cached)) as f:
+                etag, last_modified = f.headers.get('ETag'), f.headers.get('Last-Modified')
+                while n := f.readinto(buffer):
+                    consume(view[:n])
+                    size += n
+            self.not_modified = False
+        except urllib.error.HTTPError as ex:
+            if ex.code != 304 or cached is None:
+                raise
+            # not modified - the cached body is still valid
+            consume(memoryview(cached.body))
+            size = len(cached.body)
+            self.not_modified = True
+        end_time = perf_counter()
+
+        if chunks is not None:
+            self._page = b''.join(chunks)
+            if self.cache is not None and not self.not_modified and (etag or last_modified):
+                self.cache.put(self.url, CachedResponse(self._page, etag, last_modified))
+        self._page_size = size
+        self._load_time_secs = end_time - start_time
+        if hasher is not None:
+            self._digest = hasher.hexdigest()
+#Let's try this with a local stand-in server that serves a page of n bytes for the path /n, once with a Content-Length header, and once (for paths starting with /nolength) without one:
+
+class SizedHandler(BaseHTTPRequestHandler):
+    block = b'x' * 1024 ** 2
+
+    def _send_headers(self):
+        path = self.path.strip('/')
+        with_length = not path.startswith('nolength')
+        size = int(path.removeprefix('nolength/'))
+        self.send_response(200)
+        if with_length:
+            self.send_header('Content-Length', str(size))
+        self.end_headers()
+        return size
+
+    def do_HEAD(self):
+        self._send_headers()
+
+    def do_GET(self):
+        size = self._send_headers()
+        while size > 0:
+            self.wfile.write(self.block[:size])
+            size -= len(self.block)
+
+    def log_message(self, *args):
+        pass
+
+server, base_url = start_stand_in_server(SizedHandler)
+#With a Content-Length, the size comes from the HEAD request - nothing gets downloaded:
+
+page = StreamingWebPage(f'{base_url}/200000000', stream=True)
+page.page_size, page._load_time_secs, page._page
+#(200000000, None, None)
+#Without one, the page is streamed, counted and thrown away. Let's compare the memory used to get the size of a 200 MB page that way, and with the default (non-streaming) mode:
+
+import tracemalloc
+
+def peak_memory(func):
+    tracemalloc.start()
+    result = func()
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return result, f'{peak / 1024 ** 2:.1f} MB'
+
+url = f'{base_url}/nolength/200000000'
+peak_memory(lambda: StreamingWebPage(url).page_size)
+#(200000000, '381.9 MB')
+peak_memory(lambda: StreamingWebPage(url, stream=True).page_size)
+#(200000000, '0.8 MB')
+#(The non-streaming version even needs twice the page size at its peak, while the chunks it read are joined together.)
+
+#We can also compute a checksum as the page streams by, and hand the chunks to a callback - here we just count them:
+
+chunk_sizes = []
+page = StreamingWebPage(url, stream=True, hash_name='sha256', callback=lambda chunk: chunk_sizes.append(len(chunk)))
+page.digest == hashlib.sha256(b'x' * 200_000_000).hexdigest(), page.page_size, len(chunk_sizes) > 1
+#(True, 200000000, True)
+#And if we do need the page itself, it gets downloaded (and kept) on demand:
+
+page = StreamingWebPage(f'{base_url}/nolength/1000', stream=True)
+page.page_size, page._page
+#(1000, None)
+len(page.page)
+#1000
+server.shutdown()
+server.server_close()
+#The cache still works in streaming mode - against the ETag server from the previous section, the second page only gets a 304, and its size and digest come from the cached body:
+
+server, base_url = start_stand_in_server(ETagHandler)
+cache = MemoryResponseCache()
+StreamingWebPage(f'{base_url}/b', cache=cache).page_size
+#200000
+sent = ETagHandler.body_bytes_sent
+page = StreamingWebPage(f'{base_url}/b', cache=cache, stream=True, hash_name='sha256')
+page.digest == hashlib.sha256(b'b' * 200_000).hexdigest(), page.not_modified, ETagHandler.body_bytes_sent - sent
+#(True, True, 0)
+server.shutdown()
+server.server_close()
+
+
+# =============================================================================
+# Where Does the Time Go?
+# time_elapsed gives us a single number for the whole download - but a slow download can be slow for very different reasons: a slow DNS lookup, a far away server (slow TCP connect), an expensive TLS handshake, a server that takes a long time to start responding (time to first byte), or just a big page on a slow network (transfer).
+#
+# urlopen does all of these steps for us, and does not tell us how long each one took. So let's do them ourselves, one at a time, timing each phase with perf_counter:
+# - dns: socket.getaddrinfo
+# - connect: the TCP connection - like socket.create_connection, we try each of the addresses getaddrinfo returned in turn (localhost, for example, often resolves to the IPv6 address ::1 first, even if the server only listens on 127.0.0.1), so this includes the time spent on any failed attempts
+# - tls: wrapping the socket with ssl (https only, 0 for http)
+# - ttfb (time to first byte): sending the request, until the status line and headers have arrived - we let http.client do the HTTP part, over the socket we already connected
+# - transfer: reading the body, until the response is closed
+#
+# The timings are stored in a PhaseTimings named tuple, that also computes the throughput (bytes/sec) of the transfer. Redirects are followed, and the timings are the ones of the final request.
+#
+# InstrumentedWebPage extends StreamingWebPage (so it keeps the response cache, and the streaming mode) and only overrides _open: GET requests go through _timed_open, that returns the response wrapped in an object that counts the bytes as they are read, and records the timings when the response is closed. (HEAD requests are not timed. A 304 response served from the cache still took a round trip to the server, so its timings are recorded too, with nothing transferred - timings never has to go back to the server once the page has been downloaded.)
+#
+# A single download does not tell us much though (network timings vary a lot), so InstrumentedWebPage can also record its timings in a LatencyStats object, shared by many pages, that reports percentiles (p50, p90, p99, ...) for each phase. We want to be able to do that across thousands (or millions) of downloads, so rather than keeping every sample, LatencyStats keeps a LogHistogram per phase: a histogram that only counts how many samples fall into each bucket, in an array('Q') of counts that is allocated once, up front. The bucket boundaries grow geometrically (each bucket is 2% wider than the previous one), so any duration from 1 ns to an hour fits in about 1,500 buckets, and a percentile read off the histogram (the middle of the bucket it falls in) is within about 1% of the exact value. Durations are recorded in nanoseconds, and throughput in bytes/sec.
+# =============================================================================
+
+import http.client
+import socket
+import ssl
+import urllib.error
+from array import array
+from collections import namedtuple
+from math import log
+from time import perf_counter
+from urllib.parse import urljoin, urlsplit
+
+class PhaseTimings(namedtuple('PhaseTimings', 'dns connect tls ttfb transfer bytes')):
+    __slots__ = ()
+
+    @property
+    def total(self):
+        return self.dns + self.connect + self.tls + self.ttfb + self.transfer
+
+    @property
+    def throughput(self):
+        # bytes/sec while transferring the body
+        return self.bytes / self.transfer if self.transfer else float('inf')
+
+class LogHistogram:
+    def __init__(self, growth=1.02, max_value=3_600 * 10 ** 9):
+        self.growth = growth
+        self._log_growth = log(growth)
+        self._counts = array('Q', bytes(8 * (self._bucket(max_value) + 1)))
+        self.count = 0
+        self.total = 0
+        self.min = None
+        self.max = None
+
+    def _bucket(self, value):
+        # bucket i holds values in [growth ** i, growth ** (i + 1))
+        return int(log(value) / self._log_growth) if value >= 1 else 0
+
+    def record(self, value):
+        counts = self._counts
+        counts[min(self._bucket(value), len(counts) - 1)] += 1
+        self.count += 1
+        self.total += value
+        if self.min is None or value < self.min:
+            self.min = value
+        if self.max is None or value > self.max:
+            self.max = value
+
+    def percentile(self, p):
+        if not self.count:
+            return None
+        rank = max(1, p * self.count / 100)
+        seen = 0
+        for i, count in enumerate(self._counts):
+            seen += count
+            if seen >= rank:
+                break
+        # the middle of the bucket, but never outside the values we actually saw
+        value = self.growth ** (i + 0.5)
+        return min(max(value, self.min), self.max)
+
+class LatencyStats:
+    phases = ('dns', 'connect', 'tls', 'ttfb', 'transfer', 'total', 'throughput')
+
+    def __init__(self):
+        # durations in ns (up to an hour), throughput in bytes/sec (up to 1 TB/sec)
+        self._histograms = {phase: LogHistogram() for phase in self.phases[:-1]}
+        self._histograms['throughput'] = LogHistogram(max_value=10 ** 12)
+
+    def __len__(self):
+        return self._histograms['total'].count
+
+    def add(self, timings):
+        for phase in self.phases[:-1]:
+            self._histograms[phase].record(getattr(timings, phase) * 10 ** 9)
+        if timings.transfer:
+            self._histograms['throughput'].record(timings.throughput)
+
+    def percentile(self, phase, p):
+        # durations in seconds, throughput in bytes/sec
+        value = self._histograms[phase].percentile(p)
+        if value is None or phase == 'throughput':
+            return value
+        return value / 10 ** 9
+
+    def summary(self, percentiles=(50, 90, 99)):
+        return {
+            phase: {f'p{p}': self.percentile(phase, p) for p in percentiles}
+            for phase in self.phases
+        }
+
+def _connect(addresses, timeout):
+    # like socket.create_connection: try each address in turn, until one of them connects
+    error = None
+    for family, type_, proto, _, address in addresses:
+        sock = socket.socket(family, type_, proto)
+        sock.settimeout(timeout)
+        try:
+            sock.connect(address)
+            return sock
+        except OSError as ex:
+            sock.close()
+            error = ex
+    raise error
+
+class _TimedResponse:
+    # wraps an http.client.HTTPResponse: counts the body bytes as they are read,
+    # and reports the timings of all the phases once it is closed
+    def __init__(self, response, connection, phases, first_byte, on_close):
+        self._response = response
+        self._connection = connection
+        self._phases = phases
+        self._first_byte = first_byte
+        self._on_close = on_close
+        self._bytes = 0
+        self._closed = False
+
+    @property
+    def status(self):
+        return self._response.status
+
+    @property
+    def headers(self):
+        return self._response.headers
+
+    def read(self, amt=None):
+        data = self._response.read(amt)
+        self._bytes += len(data)
+        return data
+
+    def readinto(self, buffer):
+        n = self._response.readinto(buffer)
+        self._bytes += n
+        return n
+
+    def close(self):
+        if self._closed:
+            return
+        self._closed = True
+        done = perf_counter()
+        self._connection.close()
+        timings = PhaseTimings(*self._phases, transfer=done - self._first_byte, bytes=self._bytes)
+        if self._on_close is not None:
+            self._on_close(timings)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+def _timed_open(url, headers=None, timeout=None, max_redirects=5, on_close=None):
+    for _ in range(max_redirects + 1):
+        parts = urlsplit(url)
+        https = parts.scheme == 'https'
+        port = parts.port or (443 if https else 80)
+        path = parts.path or '/'
+        if parts.query:
+            path += '?' + parts.query
+
+        start = perf_counter()
+        addresses = socket.getaddrinfo(parts.hostname, port, type=socket.SOCK_STREAM)
+        resolved = perf_counter()
+        sock = _connect(addresses, timeout)
+        connected = perf_counter()
+        try:
+            if https:
+                sock = ssl.create_default_context().wrap_socket(sock, server_hostname=parts.hostname)
+            handshaken = perf_counter()
+            connection_class = http.client.HTTPSConnection if https else http.client.HTTPConnection
+            connection = connection_class(parts.hostname, port, timeout=timeout)
+            connection.sock = sock  # use the socket we connected ourselves
+            connection.request('GET', path, headers={'Host': parts.netloc, **(headers or {})})
+            response = connection.getresponse()
+            first_byte = perf_counter()
+        except BaseException:
+            sock.close()
+            raise
+
+        if response.status in (301, 302, 303, 307, 308) and response.getheader('Location'):
+            connection.close()
+            url = urljoin(url, response.getheader('Location'))
+            continue
+        phases = (resolved - start, connected - resolved, handshaken - connected, first_byte - handshaken)
+        if not 200 <= response.status < 300:
+            # just like urlopen (this includes 304 Not Modified)
+            connection.close()
+            if response.status == 304 and on_close is not None:
+                # the cached body gets used, but the round trip still counts - with nothing transferred
+                on_close(PhaseTimings(*phases, transfer=0, bytes=0))
+            raise urllib.error.HTTPError(url, response.status, response.reason, response.headers, None)
+        return _TimedResponse(response, connection, phases, first_byte, on_close)
+    raise urllib.error.URLError(f'Too many redirects for {url}')
+
+class InstrumentedWebPage(StreamingWebPage):
+    def __init__(self, url, stats=None, **kwargs):
+        self.stats = stats
+        super().__init__(url, **kwargs)
+
+    @StreamingWebPage.url.setter
+    def url(self, value):
+        StreamingWebPage.url.fset(self, value)
+        self._timings = None
+
+    @property
+    def timings(self):
+        if self._timings is None:
+            self.download_page(keep_body=not self.stream)
+        return self._timings
+
+    def _open(self, headers, method='GET'):
+        if method != 'GET':
+            return super()._open(headers, method)
+        return _timed_open(self.url, headers, on_close=self._record_timings)
+
+    def _record_timings(self, timings):
+        self._timings = timings
+        if self.stats is not None:
+            self.stats.add(timings)
+#Once again, let's use a local stand-in server, that waits a random amount of time (between 10 and 50 ms) before responding, and then sends the page in 10 pieces, with a short pause between each one. This time we'll use localhost in the urls - _connect falls back to 127.0.0.1 if localhost resolves to ::1 first:
+
+from random import uniform
+from time import sleep
+
+class SlowHandler(BaseHTTPRequestHandler):
+    def do_GET(self):
+        sleep(uniform(0.01, 0.05))
+        size = int(self.path.strip('/'))
+        self.send_response(200)
+        self.send_header('Content-Length', str(size))
+        self.end_headers()
+        self.wfile.flush()
+        for _ in range(10):
+            sleep(0.002)
+            self.wfile.write(b'x' * (size // 10))
+
+    def log_message(self, *args):
+        pass
+
+server, base_url = start_stand_in_server(SlowHandler)
+base_url = base_url.replace('127.0.0.1', 'localhost')
+
+page = InstrumentedWebPage(f'{base_url}/100000')
+page.page_size
+#100000
+timings = page.timings
+print(', '.join(f'{phase}={getattr(timings, phase) * 1000:.2f}ms' for phase in ('dns', 'connect', 'tls', 'ttfb', 'transfer')))
+print(f'{timings.throughput / 1024 ** 2:.1f} MB/s')
+#dns=0.06ms, connect=0.11ms, tls=0.00ms, ttfb=24.62ms, transfer=28.60ms
+#3.3 MB/s
+#As expected, almost all the time was spent waiting for the server to respond (ttfb), and then transferring the page. Now let's collect the timings of 200 downloads:
+
+stats = LatencyStats()
+for _ in range(200):
+    InstrumentedWebPage(f'{base_url}/100000', stats=stats).page_size
+
+for phase, percentiles in stats.summary().items():
+    if phase == 'throughput':
+        print(f'{phase:>10}', '  '.join(f'{p}={value / 1024 ** 2:6.1f}MB/s' for p, value in percentiles.items()))
+    else:
+        print(f'{phase:>10}', '  '.join(f'{p}={value * 1000:6.2f}ms' for p, value in percentiles.items()))
+#       dns p50=  0.12ms  p90=  0.14ms  p99=  0.68ms
+#   connect p50=  0.30ms  p90=  0.41ms  p99=  4.32ms
+#       tls p50=  0.00ms  p90=  0.00ms  p99=  0.00ms
+#      ttfb p50= 31.89ms  p90= 47.39ms  p99= 51.29ms
+#  transfer p50= 23.23ms  p90= 28.88ms  p99= 39.65ms
+#     total p50= 56.63ms  p90= 71.82ms  p99= 80.88ms
+#throughput p50=   4.1MB/s  p90=   4.5MB/s  p99=   4.5MB/s
+#The histograms have a fixed size, however many downloads we record:
+
+len(stats), len(stats._histograms['total']._counts)
+#(200, 1461)
+#And if the first address we get can't be connected to, _connect moves on to the next one (here, nothing listens on port 1):
+
+addresses = socket.getaddrinfo('127.0.0.1', 1, type=socket.SOCK_STREAM) + socket.getaddrinfo('127.0.0.1', server.server_port, type=socket.SOCK_STREAM)
+with _connect(addresses, timeout=5) as sock:
+    print(sock.getpeername()[1] == server.server_port)
+#True
+server.shutdown()
+server.server_close()
+#Finally, when a page has not been modified the server only sends a 304 - its timings cover the round trip up to the first byte, with nothing transferred, and reading them again does not go back to the server:
+
+server, base_url = start_stand_in_server(ETagHandler)
+cache = MemoryResponseCache()
+InstrumentedWebPage(f'{base_url}/b', cache=cache).page_size
+#200000
+page = InstrumentedWebPage(f'{base_url}/b', cache=cache)
+timings = page.timings
+page.not_modified, timings.transfer, timings.bytes, page.timings is timings
+#(True, 0, 0, True)
+server.shutdown()
+server.server_close()
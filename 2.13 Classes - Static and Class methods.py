@@ -405,3 +405,599 @@ print(f'Elapsed: {t2.elapsed} seconds')
 # Elapsed: 3.005218 seconds
 # =============================================================================
 ​
+
+
+# =============================================================================
+# A Monotonic Timer
+# Our Timer calls datetime.now(timezone.utc) every time we start or stop it, and computes elapsed by subtracting two datetimes (creating a timedelta along the way). That's fine for timing something that takes a couple of seconds, but:
+# - it is relatively slow, and allocates datetime objects on every start/stop - which adds up if we time code that runs thousands of times
+# - the wall clock is not monotonic: if the system clock gets adjusted (NTP, daylight savings on a misconfigured machine, someone changing the time) while a timer is running, the elapsed time is simply wrong - it can even be negative!
+#
+# The time module has a clock designed for measuring intervals: perf_counter_ns. It is monotonic (it never goes backwards), has the highest available resolution, and returns a plain integer number of nanoseconds - no objects to allocate, and no floating point rounding.
+#
+# So let's add a monotonic mode to the Timer. In that mode, start() and stop() only record perf_counter_ns(), and the (wall clock) start_time and end_time datetimes are only computed when they are actually requested. To do that, the class records a single (wall clock, perf_counter) pair of readings when it is created - an anchor - and converts perf_counter readings to wall clock times relative to that anchor.
+#
+# (The two clocks can drift apart slowly over a long time, so the wall clock times in monotonic mode can be off by a little - the elapsed time, which is what we usually care about, is exact.)
+# =============================================================================
+
+from time import perf_counter_ns, time_ns
+
+class Timer:
+    tz = timezone.utc  # class variable to store the timezone - default to UTC
+    # wall clock and perf_counter readings, taken at the same time
+    _anchor_ns = (time_ns(), perf_counter_ns())
+
+    def __init__(self, monotonic=False):
+        self.monotonic = monotonic
+        # use these instance variables to keep track of start/end times
+        # (datetimes, or perf_counter_ns readings in monotonic mode)
+        self._time_start = None
+        self._time_end = None
+
+    @staticmethod
+    def current_dt_utc():
+        """Returns non-naive current UTC"""
+        return datetime.now(timezone.utc)
+
+    @classmethod
+    def set_tz(cls, offset, name):
+        cls.tz = timezone(timedelta(hours=offset), name)
+
+    @classmethod
+    def current_dt(cls):
+        return datetime.now(cls.tz)
+
+    @classmethod
+    def _dt_from_perf_counter_ns(cls, counter_ns):
+        wall_ns, anchor_counter_ns = cls._anchor_ns
+        return datetime.fromtimestamp((wall_ns + counter_ns - anchor_counter_ns) / 1e9, timezone.utc)
+
+    def start(self):
+        if self.monotonic:
+            self._time_start = perf_counter_ns()
+        else:
+            # internally we always non-naive UTC
+            self._time_start = self.current_dt_utc()
+        self._time_end = None
+
+    def stop(self):
+        if self._time_start is None:
+            # cannot stop if timer was not started!
+            raise TimerError('Timer must be started before it can be stopped.')
+        self._time_end = perf_counter_ns() if self.monotonic else self.current_dt_utc()
+
+    def _as_dt(self, value):
+        if self.monotonic:
+            value = self._dt_from_perf_counter_ns(value)
+        return value
+
+    @property
+    def start_time(self):
+        if self._time_start is None:
+            raise TimerError('Timer has not been started.')
+        # since tz is a class variable, we can just as easily access it from self
+        return self._as_dt(self._time_start).astimezone(self.tz)
+
+    @property
+    def end_time(self):
+        if self._time_end is None:
+            raise TimerError('Timer has not been stopped.')
+        return self._as_dt(self._time_end).astimezone(self.tz)
+
+    @property
+    def elapsed_ns(self):
+        if self._time_start is None:
+            raise TimerError('Timer must be started before an elapsed time is available')
+        if not self.monotonic:
+            return round(self.elapsed * 1e9)
+        # timer has not been stopped: elapsed between start and now
+        time_end = perf_counter_ns() if self._time_end is None else self._time_end
+        return time_end - self._time_start
+
+    @property
+    def elapsed(self):
+        if self._time_start is None:
+            raise TimerError('Timer must be started before an elapsed time is available')
+        if self.monotonic:
+            return self.elapsed_ns / 1e9
+
+        if self._time_end is None:
+            # timer has not ben stopped, calculate elapsed between start and now
+            elapsed_time = self.current_dt_utc() - self._time_start
+        else:
+            # timer has been stopped, calculate elapsed between start and end
+            elapsed_time = self._time_end - self._time_start
+
+        return elapsed_time.total_seconds()
+from time import sleep
+
+t = Timer(monotonic=True)
+t.start()
+sleep(0.5)
+t.stop()
+t._time_start, t._time_end
+#(2855852963187, 2856353252822)
+#All we stored were two integers. The datetimes are only created when we ask for them:
+
+Timer.set_tz(-7, 'MST')
+print(f'Start time: {t.start_time}')
+print(f'End time: {t.end_time}')
+print(f'Elapsed: {t.elapsed} seconds ({t.elapsed_ns} ns)')
+#Start time: 2026-10-18 08:00:53.623739-07:00
+#End time: 2026-10-18 08:00:54.124028-07:00
+#Elapsed: 0.500289635 seconds (500289635 ns)
+#Now let's see how much overhead each mode adds to what we are timing, by timing a million start/stop pairs:
+
+from timeit import timeit
+
+wall_timer = Timer()
+monotonic_timer = Timer(monotonic=True)
+
+def start_stop(timer, n=1_000_000):
+    start, stop = timer.start, timer.stop
+    for _ in range(n):
+        start()
+        stop()
+
+for timer in (wall_timer, monotonic_timer):
+    secs = timeit(lambda: start_stop(timer), number=1)
+    print(f'monotonic={timer.monotonic}: {secs * 1000:.0f} ns per start/stop pair')
+#monotonic=False: 1009 ns per start/stop pair
+#monotonic=True: 246 ns per start/stop pair
+#So the monotonic timer is about 4x cheaper per start/stop pair. And even the shortest intervals (here, nothing at all between start and stop) are now measured in (integer) nanoseconds:
+
+for _ in range(3):
+    monotonic_timer.start()
+    monotonic_timer.stop()
+    print(monotonic_timer.elapsed_ns)
+#1158
+#778
+#523
+
+
+# =============================================================================
+# Timer Registries and Histograms
+# A Timer only remembers the last start/stop pair. If we want to time a piece of code that runs thousands (or millions) of times, we want to know how long it takes typically, and how long it takes in the worst cases - i.e. the distribution of the elapsed times, not just the last one.
+#
+# Keeping every measurement in a list would work, but the memory used grows with the number of measurements. Instead, we can keep a histogram: we split the range of possible durations into buckets, and only count how many measurements fall in each bucket. If the bucket boundaries grow geometrically (each bucket is 2% wider than the previous one), any duration from 1 ns to an hour fits in about 1,500 buckets, and any percentile we compute from the histogram is within about 1% of the exact value. The counts are stored in an array('Q') that is allocated once - so the memory used is the same after 10 or 10 billion measurements. We also keep the exact count, total (for the mean), min and max.
+#
+# A TimerRegistry keeps one histogram per name, and gives us three ways to record into them:
+# - registry.timer(name) returns a (monotonic) Timer that records its elapsed time every time it is stopped
+# - Timers are context managers, so we can time a block of code with a with statement
+# - registry.timed(name) is a decorator, that times every call to the function it decorates (without creating a Timer for every call) - @registry.timed on its own uses the function's qualified name
+# =============================================================================
+
+from array import array
+from functools import wraps
+from math import log
+
+class LogHistogram:
+    def __init__(self, growth=1.02, max_value=3_600 * 10 ** 9):
+        self.growth = growth
+        self._log_growth = log(growth)
+        self._counts = array('Q', bytes(8 * (self._bucket(max_value) + 1)))
+        self.count = 0
+        self.total = 0
+        self.min = None
+        self.max = None
+
+    def _bucket(self, value):
+        # bucket i holds values in [growth ** i, growth ** (i + 1))
+        return int(log(value) / self._log_growth) if value >= 1 else 0
+
+    def record(self, value):
+        counts = self._counts
+        counts[min(self._bucket(value), len(counts) - 1)] += 1
+        self.count += 1
+        self.total += value
+        if self.min is None or value < self.min:
+            self.min = value
+        if self.max is None or value > self.max:
+            self.max = value
+
+    @property
+    def mean(self):
+        return self.total / self.count if self.count else None
+
+    def percentile(self, p):
+        if not self.count:
+            return None
+        rank = max(1, p * self.count / 100)
+        seen = 0
+        for i, count in enumerate(self._counts):
+            seen += count
+            if seen >= rank:
+                break
+        # the middle of the bucket, but never outside the values we actually saw
+        value = self.growth ** (i + 0.5)
+        return min(max(value, self.min), self.max)
+
+    def summary(self):
+        return {
+            'count': self.count,
+            'mean': self.mean,
+            'p50': self.percentile(50),
+            'p95': self.percentile(95),
+            'p99': self.percentile(99),
+            'max': self.max,
+        }
+
+class TimerRegistry:
+    def __init__(self):
+        self._histograms = {}
+
+    def histogram(self, name):
+        histogram = self._histograms.get(name)
+        if histogram is None:
+            histogram = self._histograms[name] = LogHistogram()
+        return histogram
+
+    def record(self, name, elapsed_ns):
+        self.histogram(name).record(elapsed_ns)
+
+    def timer(self, name):
+        return Timer(monotonic=True, name=name, registry=self)
+
+    def timed(self, name=None):
+        if callable(name):
+            # used as @registry.timed, without parentheses - name is actually the function to decorate
+            return self.timed()(name)
+
+        def decorator(func):
+            record = self.histogram(name or func.__qualname__).record
+
+            @wraps(func)
+            def inner(*args, **kwargs):
+                start = perf_counter_ns()
+                try:
+                    return func(*args, **kwargs)
+                finally:
+                    record(perf_counter_ns() - start)
+            return inner
+        return decorator
+
+    def report(self):
+        # all times in nanoseconds
+        return {name: histogram.summary() for name, histogram in self._histograms.items()}
+
+class Timer:
+    tz = timezone.utc  # class variable to store the timezone - default to UTC
+    # wall clock and perf_counter readings, taken at the same time
+    _anchor_ns = (time_ns(), perf_counter_ns())
+
+    def __init__(self, monotonic=False, name=None, registry=None):
+        if registry is not None and name is None:
+            raise TimerError('A Timer recording into a registry needs a name.')
+        self.monotonic = monotonic
+        self.name = name
+        self.registry = registry
+        # use these instance variables to keep track of start/end times
+        # (datetimes, or perf_counter_ns readings in monotonic mode)
+        self._time_start = None
+        self._time_end = None
+
+    @staticmethod
+    def current_dt_utc():
+        """Returns non-naive current UTC"""
+        return datetime.now(timezone.utc)
+
+    @classmethod
+    def set_tz(cls, offset, name):
+        cls.tz = timezone(timedelta(hours=offset), name)
+
+    @classmethod
+    def current_dt(cls):
+        return datetime.now(cls.tz)
+
+    @classmethod
+    def _dt_from_perf_counter_ns(cls, counter_ns):
+        wall_ns, anchor_counter_ns = cls._anchor_ns
+        return datetime.fromtimestamp((wall_ns + counter_ns - anchor_counter_ns) / 1e9, timezone.utc)
+
+    def start(self):
+        if self.monotonic:
+            self._time_start = perf_counter_ns()
+        else:
+            # internally we always non-naive UTC
+            self._time_start = self.current_dt_utc()
+        self._time_end = None
+
+    def stop(self):
+        if self._time_start is None:
+            # cannot stop if timer was not started!
+            raise TimerError('Timer must be started before it can be stopped.')
+        self._time_end = perf_counter_ns() if self.monotonic else self.current_dt_utc()
+        if self.registry is not None:
+            self.registry.record(self.name, self.elapsed_ns)
+
+    def __enter__(self):
+        self.start()
+        return self
+
+    def __exit__(self, exc_type, exc_value, exc_tb):
+        self.stop()
+        return False
+
+    def _as_dt(self, value):
+        if self.monotonic:
+            value = self._dt_from_perf_counter_ns(value)
+        return value
+
+    @property
+    def start_time(self):
+        if self._time_start is None:
+            raise TimerError('Timer has not been started.')
+        # since tz is a class variable, we can just as easily access it from self
+        return self._as_dt(self._time_start).astimezone(self.tz)
+
+    @property
+    def end_time(self):
+        if self._time_end is None:
+            raise TimerError('Timer has not been stopped.')
+        return self._as_dt(self._time_end).astimezone(self.tz)
+
+    @property
+    def elapsed_ns(self):
+        if self._time_start is None:
+            raise TimerError('Timer must be started before an elapsed time is available')
+        if not self.monotonic:
+            return round(self.elapsed * 1e9)
+        # timer has not been stopped: elapsed between start and now
+        time_end = perf_counter_ns() if self._time_end is None else self._time_end
+        return time_end - self._time_start
+
+    @property
+    def elapsed(self):
+        if self._time_start is None:
+            raise TimerError('Timer must be started before an elapsed time is available')
+        if self.monotonic:
+            return self.elapsed_ns / 1e9
+
+        if self._time_end is None:
+            # timer has not ben stopped, calculate elapsed between start and now
+            elapsed_time = self.current_dt_utc() - self._time_start
+        else:
+            # timer has been stopped, calculate elapsed between start and end
+            elapsed_time = self._time_end - self._time_start
+
+        return elapsed_time.total_seconds()
+#Let's time a function whose running time varies with its argument, using all three forms:
+
+from random import randint
+
+registry = TimerRegistry()
+
+@registry.timed
+def build_list(n):
+    return list(range(n))
+
+sizes = [randint(1, 10_000) for _ in range(100_000)]
+for n in sizes:
+    build_list(n)
+
+timer = registry.timer('sum')
+for n in sizes[:10_000]:
+    timer.start()
+    sum(range(n))
+    timer.stop()
+
+for n in sizes[:10_000]:
+    with registry.timer('sorted'):
+        sorted(range(n, 0, -1))
+
+for name, summary in registry.report().items():
+    print(f'{name:>10}', '  '.join(f'{key}={value:,.0f}' for key, value in summary.items()))
+#build_list count=100,000  mean=60,083  p50=58,721  p95=115,133  p99=124,624  max=6,029,380
+#       sum count=10,000  mean=112,833  p50=112,876  p95=208,548  p99=230,254  max=4,372,778
+#    sorted count=10,000  mean=133,544  p50=132,252  p95=249,234  p99=269,779  max=1,642,447
+#(all times in nanoseconds)
+
+#How close are those percentiles to the exact ones? Let's record the same durations in a histogram, and in a list we can sort:
+
+from random import lognormvariate
+
+durations = [round(lognormvariate(10, 1)) for _ in range(1_000_000)]
+histogram = LogHistogram()
+for duration in durations:
+    histogram.record(duration)
+durations.sort()
+for p in (50, 95, 99):
+    exact = durations[round(p / 100 * len(durations)) - 1]
+    print(f'p{p}: exact={exact:,}  histogram={histogram.percentile(p):,.0f}  error={abs(histogram.percentile(p) / exact - 1):.2%}')
+#p50: exact=22,048  histogram=22,253  error=0.93%
+#p95: exact=114,300  histogram=115,133  error=0.73%
+#p99: exact=223,916  histogram=225,739  error=0.81%
+#And the histogram takes the same (small) amount of memory, however many durations we record - the list of durations on the other hand grows with every measurement:
+
+import sys
+
+sys.getsizeof(histogram._counts), sys.getsizeof(durations)
+#(12520, 8448728)
+
+
+# =============================================================================
+# Caching Time Zone Conversions
+# Every time we read start_time or end_time, the Timer converts the stored UTC (or perf_counter) time to the current time zone with astimezone - even if neither the time nor the time zone changed since the last time we asked. If we have dashboards reading those properties over and over again, that's a lot of identical conversions (and new datetime objects).
+#
+# Just like we cached the area of the circle earlier, we can cache the converted start and end times in the instance. The catch is that the cached value depends on tz - a class attribute, that can be changed at any time, for all instances at once, and we certainly don't want to go through every Timer instance to clear its cache when that happens.
+#
+# Instead, the class keeps a version number for its time zone, that set_tz increments every time it actually changes the time zone. Each instance caches the converted value together with the tz version (and the tz object itself, in case tz was assigned directly, or overridden in the instance) it was computed with - if either one is different when we read the property, the cached value is stale, and we recompute it. Starting or stopping the timer clears the caches too.
+#
+# While we're at it, set_tz creates a new timezone object every time it's called - even for a time zone we've already used. So we'll intern them: the class keeps a dictionary of the timezone objects it has created, keyed by (offset, name), and set_tz re-uses them. Setting the time zone we already have is then a no-op, and does not invalidate any cached times.
+# =============================================================================
+
+class Timer:
+    tz = timezone.utc  # class variable to store the timezone - default to UTC
+    _tz_version = 0
+    _timezones = {}  # (offset, name) -> timezone, shared by all timers
+    # wall clock and perf_counter readings, taken at the same time
+    _anchor_ns = (time_ns(), perf_counter_ns())
+
+    def __init__(self, monotonic=False, name=None, registry=None):
+        if registry is not None and name is None:
+            raise TimerError('A Timer recording into a registry needs a name.')
+        self.monotonic = monotonic
+        self.name = name
+        self.registry = registry
+        # use these instance variables to keep track of start/end times
+        # (datetimes, or perf_counter_ns readings in monotonic mode)
+        self._time_start = None
+        self._time_end = None
+        # (tz version, tz, converted datetime)
+        self._start_time_cache = None
+        self._end_time_cache = None
+
+    @staticmethod
+    def current_dt_utc():
+        """Returns non-naive current UTC"""
+        return datetime.now(timezone.utc)
+
+    @classmethod
+    def get_tz(cls, offset, name):
+        key = (offset, name)
+        tz = cls._timezones.get(key)
+        if tz is None:
+            tz = cls._timezones[key] = timezone(timedelta(hours=offset), name)
+        return tz
+
+    @classmethod
+    def set_tz(cls, offset, name):
+        tz = cls.get_tz(offset, name)
+        if tz is not cls.tz:
+            cls.tz = tz
+            cls._tz_version += 1
+
+    @classmethod
+    def current_dt(cls):
+        return datetime.now(cls.tz)
+
+    @classmethod
+    def _dt_from_perf_counter_ns(cls, counter_ns):
+        wall_ns, anchor_counter_ns = cls._anchor_ns
+        return datetime.fromtimestamp((wall_ns + counter_ns - anchor_counter_ns) / 1e9, timezone.utc)
+
+    def start(self):
+        if self.monotonic:
+            self._time_start = perf_counter_ns()
+        else:
+            # internally we always non-naive UTC
+            self._time_start = self.current_dt_utc()
+        self._time_end = None
+        self._start_time_cache = self._end_time_cache = None
+
+    def stop(self):
+        if self._time_start is None:
+            # cannot stop if timer was not started!
+            raise TimerError('Timer must be started before it can be stopped.')
+        self._time_end = perf_counter_ns() if self.monotonic else self.current_dt_utc()
+        self._end_time_cache = None
+        if self.registry is not None:
+            self.registry.record(self.name, self.elapsed_ns)
+
+    def __enter__(self):
+        self.start()
+        return self
+
+    def __exit__(self, exc_type, exc_value, exc_tb):
+        self.stop()
+        return False
+
+    def _as_dt(self, value):
+        if self.monotonic:
+            value = self._dt_from_perf_counter_ns(value)
+        return value
+
+    @property
+    def start_time(self):
+        cache = self._start_time_cache
+        if cache is not None and cache[0] == self._tz_version and cache[1] is self.tz:
+            return cache[2]
+        if self._time_start is None:
+            raise TimerError('Timer has not been started.')
+        # since tz is a class variable, we can just as easily access it from self
+        tz = self.tz
+        start_time = self._as_dt(self._time_start).astimezone(tz)
+        self._start_time_cache = (self._tz_version, tz, start_time)
+        return start_time
+
+    @property
+    def end_time(self):
+        cache = self._end_time_cache
+        if cache is not None and cache[0] == self._tz_version and cache[1] is self.tz:
+            return cache[2]
+        if self._time_end is None:
+            raise TimerError('Timer has not been stopped.')
+        tz = self.tz
+        end_time = self._as_dt(self._time_end).astimezone(tz)
+        self._end_time_cache = (self._tz_version, tz, end_time)
+        return end_time
+
+    @property
+    def elapsed_ns(self):
+        if self._time_start is None:
+            raise TimerError('Timer must be started before an elapsed time is available')
+        if not self.monotonic:
+            return round(self.elapsed * 1e9)
+        # timer has not been stopped: elapsed between start and now
+        time_end = perf_counter_ns() if self._time_end is None else self._time_end
+        return time_end - self._time_start
+
+    @property
+    def elapsed(self):
+        if self._time_start is None:
+            raise TimerError('Timer must be started before an elapsed time is available')
+        if self.monotonic:
+            return self.elapsed_ns / 1e9
+
+        if self._time_end is None:
+            # timer has not ben stopped, calculate elapsed between start and now
+            elapsed_time = self.current_dt_utc() - self._time_start
+        else:
+            # timer has been stopped, calculate elapsed between start and end
+            elapsed_time = self._time_end - self._time_start
+
+        return elapsed_time.total_seconds()
+t = Timer()
+t.start()
+t.stop()
+Timer.set_tz(-7, 'MST')
+t.start_time is t.start_time
+#True
+#The second read came straight from the cache. Setting the same time zone again re-uses the interned timezone object, so the version does not change, and the cache stays valid:
+
+start_time = t.start_time
+tz, version = Timer.tz, Timer._tz_version
+Timer.set_tz(-7, 'MST')
+Timer.tz is tz, Timer._tz_version == version, t.start_time is start_time
+#(True, True, True)
+#But a different time zone invalidates the cached times of every timer:
+
+Timer.set_tz(-8, 'PST')
+t.start_time.tzinfo, t.end_time.tzinfo
+#(datetime.timezone(datetime.timedelta(days=-1, seconds=57600), 'PST'), datetime.timezone(datetime.timedelta(days=-1, seconds=57600), 'PST'))
+#And so does overriding tz in a single instance (or assigning Timer.tz directly):
+
+t.tz = timezone.utc
+t.start_time.tzinfo
+#datetime.timezone.utc
+del t.tz
+t.start_time.tzinfo
+#datetime.timezone(datetime.timedelta(days=-1, seconds=57600), 'PST')
+#Let's compare the cost of reading start_time a million times, with and without the cache (start_time_uncached is just what start_time used to be):
+
+from timeit import timeit
+
+def start_time_uncached(timer):
+    if timer._time_start is None:
+        raise TimerError('Timer has not been started.')
+    return timer._as_dt(timer._time_start).astimezone(timer.tz)
+
+wall_timer, monotonic_timer = Timer(), Timer(monotonic=True)
+for timer in (wall_timer, monotonic_timer):
+    timer.start()
+    timer.stop()
+    uncached = timeit(lambda: start_time_uncached(timer), number=1_000_000)
+    cached = timeit(lambda: timer.start_time, number=1_000_000)
+    print(f'monotonic={timer.monotonic}: uncached={uncached:.2f} secs, cached={cached:.2f} secs')
+#monotonic=False: uncached=0.57 secs, cached=0.16 secs
+#monotonic=True: uncached=1.28 secs, cached=0.16 secs
@@ -219,3 +219,142 @@ MyClass.list_2
 # 
 # So they behave like a function would, and therefore are not nested in the class body scope, but, in this case, in the module/global scope!
 # =============================================================================
+
+# =============================================================================
+# Precomputing Interest Tables
+# Let's go back to the Account example from the slides:
+#
+# class Account:
+#     COMP_FREQ = 12
+#     APR = 0.02  # 2%
+#     APY = (1 + APR/COMP_FREQ) ** COMP_FREQ - 1
+#
+# APY is computed only once, in the class body - but that only works for one fixed APR and compounding frequency. As soon as accounts can have different rates or compounding schedules, we end up recomputing (1 + APR/COMP_FREQ) ** COMP_FREQ (and its powers, to project balances several periods out) over and over again.
+#
+# Instead, we can compute everything we need for a given (APR, COMP_FREQ) pair once, in an InterestSchedule object, and memoize the schedules with functools.lru_cache, so every account (and every call) with the same rate shares the same one. Each schedule also keeps a table of the growth factors (1 + APR/COMP_FREQ) ** n, extended on demand, so projecting balances n periods out is a single table lookup plus one multiplication per balance. The table only grows up to max_table_size periods (100 years of monthly compounding) - factors further out than that are just computed directly, so a single far-out projection can't make the table (shared by every account with the same rate) grow without bound.
+#
+# Notice that the class body can call get_schedule (it's a module level function, and the class body can see APR and COMP_FREQ), while the methods have to go through self or cls to find SCHEDULE - just like we discussed above.
+# =============================================================================
+
+from collections.abc import Iterable
+from functools import lru_cache
+
+class InterestSchedule:
+    # the largest number of periods we keep precomputed factors for
+    max_table_size = 1200
+
+    def __init__(self, apr, comp_freq):
+        self.apr = apr
+        self.comp_freq = comp_freq
+        self.period_factor = 1 + apr / comp_freq
+        self.apy = self.period_factor ** comp_freq - 1
+        # growth factors for 0, 1, 2, ... compounding periods
+        self._factors = [1.0]
+
+    def __repr__(self):
+        return f'InterestSchedule(apr={self.apr}, comp_freq={self.comp_freq})'
+
+    def factor(self, periods):
+        if not isinstance(periods, int):
+            raise TypeError(f'periods must be an integer - got {periods!r}.')
+        if periods < 0:
+            raise ValueError(f'periods cannot be negative - got {periods}.')
+        if periods >= self.max_table_size:
+            return self.period_factor ** periods
+        factors = self._factors
+        while len(factors) <= periods:
+            factors.append(self.period_factor ** len(factors))
+        return factors[periods]
+
+    def project_balances(self, balances, periods):
+        # periods can be a single number of periods for all the balances,
+        # or a sequence with the number of periods for each balance
+        if not isinstance(periods, Iterable):
+            factor = self.factor(periods)
+            return [balance * factor for balance in balances]
+        return [balance * self.factor(n) for balance, n in zip(balances, periods)]
+
+@lru_cache(maxsize=None)
+def get_schedule(apr, comp_freq):
+    return InterestSchedule(apr, comp_freq)
+
+class Account:
+    COMP_FREQ = 12
+    APR = 0.02  # 2%
+    SCHEDULE = get_schedule(APR, COMP_FREQ)
+    APY = SCHEDULE.apy
+
+    def __init__(self, balance, apr=None, comp_freq=None):
+        self.balance = balance
+        # accounts that don't specify their own rate or frequency use the class defaults
+        if apr is not None or comp_freq is not None:
+            self.SCHEDULE = get_schedule(self.APR if apr is None else apr,
+                                         self.COMP_FREQ if comp_freq is None else comp_freq)
+            self.APY = self.SCHEDULE.apy
+
+    def monthly_interest(self):
+        return self.balance * self.APY
+
+    @classmethod
+    def monthly_interest_2(cls, amount):
+        return amount * cls.APY
+
+    @staticmethod
+    def monthly_interest_3(amount):
+        return amount * Account.APY
+
+    def projected_balance(self, periods):
+        return self.balance * self.SCHEDULE.factor(periods)
+
+    @classmethod
+    def project_balances(cls, balances, periods, apr=None, comp_freq=None):
+        schedule = get_schedule(cls.APR if apr is None else apr,
+                                cls.COMP_FREQ if comp_freq is None else comp_freq)
+        return schedule.project_balances(balances, periods)
+Account.APY
+#0.020184355681501787
+a = Account(1000)
+b = Account(1000, apr=0.05)
+c = Account(500, apr=0.05, comp_freq=4)
+a.monthly_interest(), b.monthly_interest(), c.monthly_interest()
+#(20.184355681501785, 51.161897881732976, 25.472668457031112)
+a.projected_balance(12), b.projected_balance(24)
+#(1020.1843556815018, 1104.941335558327)
+#Accounts with the same rate share the same (memoized) schedule:
+
+b.SCHEDULE is Account(1, apr=0.05).SCHEDULE
+#True
+get_schedule.cache_info()
+#CacheInfo(hits=1, misses=3, maxsize=None, currsize=3)
+#And we can project many balances at once, reusing the same table of factors:
+
+Account.project_balances([100, 200, 300], 12)
+#[102.01843556815018, 204.03687113630036, 306.0553067044505]
+Account.project_balances([100, 200, 300], [0, 6, 12], apr=0.05)
+#[100.0, 205.05237359091782, 315.3485693645199]
+#The number of periods has to be a non-negative integer:
+
+for periods in (1.5, -1):
+    try:
+        Account.project_balances([100], periods)
+    except (TypeError, ValueError) as ex:
+        print(type(ex).__name__, ex)
+#TypeError periods must be an integer - got 1.5.
+#ValueError periods cannot be negative - got -1.
+#And projecting further out (here 500 years) does not grow the table past max_table_size:
+
+schedule = Account.SCHEDULE
+schedule.factor(6000) == schedule.period_factor ** 6000, len(schedule._factors) <= schedule.max_table_size
+#(True, True)
+#Let's compare projecting a million balances 24 periods out, recomputing the factor each time, versus using the schedule:
+
+from timeit import timeit
+from random import uniform
+
+balances = [uniform(0, 10_000) for _ in range(1_000_000)]
+APR, COMP_FREQ = 0.05, 12
+
+timeit(lambda: [balance * (1 + APR / COMP_FREQ) ** 24 for balance in balances], number=1)
+#0.2488652980000552
+timeit(lambda: Account.project_balances(balances, 24, apr=APR, comp_freq=COMP_FREQ), number=1)
+#0.06657850600004167
@@ -159,3 +159,163 @@ p.version, getattr(p, 'version')
 #But once again, this only affects that specific instance.
 
 ​
+
+#Versioned Class Attributes
+#Since every instance reads apr from the class (unless it has its own apr in its instance dictionary), changing BankAccount.apr at run time changes it for every instance, immediately.
+
+#That's usually what we want - but if we are in the middle of processing a long batch of accounts while someone changes the rate (say from another thread), the first half of the batch ends up using the old rate and the second half the new one.
+
+#One way to avoid that is to never modify the rates in place. Instead we keep them in an immutable snapshot (a read-only mapping proxy, just like the one classes use for their own __dict__, plus a version number), stored in a single class attribute:
+#    - readers "pin" the current snapshot once (that's just a single attribute read) and use it for the whole batch - it can never change under them
+#    - writers copy the current rates, apply their changes to the copy, and then publish the new snapshot by re-binding that one class attribute (copy-on-write). Rebinding an attribute is atomic, so readers see either the old snapshot or the new one, never a mix. A lock makes sure two writers don't both copy the same version and lose one of the updates.
+
+#The rates in a snapshot are stored as plain instance attributes (as well as in the read-only rates mapping), so reading pinned.apr is an ordinary attribute lookup, found straight away in the snapshot's instance dictionary.
+
+#So that code that just reads acc.apr (or BankAccount.apr) keeps working, and stays just as fast, publishing also re-binds the plain apr class attribute, right after the snapshot. Those class attributes are updated one at a time though - so code that needs several rates, or the same rate over a whole batch, to be consistent should pin a snapshot.
+
+#Since the rates become attributes of the class (and of the snapshot), their names can't be dunder names, or names that already mean something else for the class (a method, for example) - publish_rates checks that (under the lock, so two writers can't both add the same new name). inspect.getattr_static looks a name up through the class and all its bases, just like attribute access does, but without calling any descriptors.
+
+import inspect
+from threading import Lock
+from types import MappingProxyType
+
+class RateSnapshot:
+    def __init__(self, version, rates):
+        object.__setattr__(self, 'version', version)
+        object.__setattr__(self, 'rates', MappingProxyType(dict(rates)))
+        # the rates as plain attributes - snapshot.apr is then a simple instance attribute lookup
+        # (set one by one, rather than with self.__dict__.update, which would make Python create
+        # a real dictionary for the instance, and slow down every lookup)
+        for name, value in rates.items():
+            object.__setattr__(self, name, value)
+
+    def __setattr__(self, name, value):
+        raise AttributeError(f"'{type(self).__name__}' object is read-only")
+
+    def __delattr__(self, name):
+        raise AttributeError(f"'{type(self).__name__}' object is read-only")
+
+    def __repr__(self):
+        return f'RateSnapshot(version={self.version}, rates={self.rates!r})'
+
+_missing = object()
+
+class BankAccount:
+    apr = 1.2
+    _rates = RateSnapshot(1, {'apr': 1.2})
+    _rates_lock = Lock()
+
+    @classmethod
+    def pin_rates(cls):
+        return cls._rates
+
+    @classmethod
+    def _check_rate_name(cls, name):
+        if name.startswith('__') and name.endswith('__'):
+            raise ValueError(f'{name} cannot be used as the name of a rate.')
+        if name in ('version', 'rates'):
+            raise ValueError(f'{name} cannot be used as the name of a rate.')
+        if name not in cls._rates.rates and inspect.getattr_static(cls, name, _missing) is not _missing:
+            raise ValueError(f'{name} cannot be used as the name of a rate.')
+
+    @classmethod
+    def publish_rates(cls, **rates):
+        with cls._rates_lock:
+            for name in rates:
+                cls._check_rate_name(name)
+            snapshot = RateSnapshot(cls._rates.version + 1, {**cls._rates.rates, **rates})
+            cls._rates = snapshot
+            for name, value in rates.items():
+                setattr(cls, name, value)
+        return snapshot
+
+    def rate(self, name, snapshot=None):
+        # an instance attribute still hides the rate, just like before
+        value = self.__dict__.get(name, _missing)
+        if value is not _missing:
+            return value
+        if snapshot is None:
+            snapshot = type(self)._rates
+        return getattr(snapshot, name)
+acc_1 = BankAccount()
+acc_2 = BankAccount()
+rates = BankAccount.pin_rates()
+rates
+#RateSnapshot(version=1, rates=mappingproxy({'apr': 1.2}))
+BankAccount.publish_rates(apr=2.5)
+#RateSnapshot(version=2, rates=mappingproxy({'apr': 2.5}))
+#The snapshot we pinned did not change, but new readers (and plain attribute lookups) see the new rate:
+
+rates.apr, BankAccount.pin_rates().apr, acc_1.apr
+#(1.2, 2.5, 2.5)
+#And a snapshot cannot be modified:
+
+try:
+    rates.rates['apr'] = 0
+except TypeError as ex:
+    print(ex)
+#'mappingproxy' object does not support item assignment
+try:
+    rates.apr = 0
+except AttributeError as ex:
+    print(ex)
+#'RateSnapshot' object is read-only
+#Instance attributes still take precedence, if we read the rate through the rate method:
+
+acc_1.apr = 0
+acc_1.rate('apr'), acc_2.rate('apr'), acc_2.rate('apr', rates)
+#(0, 2.5, 1.2)
+#(The snapshot is only consulted when the instance has no rate of its own - so an instance can even override a rate the snapshot does not have.)
+
+acc_1.promo_apr = 4.0
+acc_1.rate('promo_apr')
+#4.0
+#New rates can be published too, as long as their names don't clash with the snapshot's own attributes, or with something else defined in the class:
+
+BankAccount.publish_rates(count=0.5)
+#RateSnapshot(version=3, rates=mappingproxy({'apr': 2.5, 'count': 0.5}))
+BankAccount.count, acc_2.count, BankAccount.pin_rates().count
+#(0.5, 0.5, 0.5)
+for name in ('version', 'rate', '__init__', '__class__'):
+    try:
+        BankAccount.publish_rates(**{name: 1.0})
+    except ValueError as ex:
+        print(ex)
+#version cannot be used as the name of a rate.
+#rate cannot be used as the name of a rate.
+#__init__ cannot be used as the name of a rate.
+#__class__ cannot be used as the name of a rate.
+#Let's see this in action, with a batch that runs while another thread keeps publishing new rates. For every account, we record the rate we see when reading the class attribute directly, and the rate we see through the pinned snapshot:
+
+from threading import Thread
+
+def publisher():
+    for i in range(20_000):
+        BankAccount.publish_rates(apr=float(i))
+
+accounts = [BankAccount() for _ in range(200_000)]
+pinned = BankAccount.pin_rates()
+thread = Thread(target=publisher)
+thread.start()
+seen_unpinned = {account.apr for account in accounts}
+seen_pinned = {account.rate('apr', pinned) for account in accounts}
+thread.join()
+len(seen_unpinned), seen_pinned
+#(2, {2.5})
+#Reading the class attribute directly, the batch saw more than one rate (how many depends on when the threads happen to switch) - with the pinned snapshot, every account in the batch used the same rate, even though the rate changed many times while the batch was running.
+
+#Let's compare the cost of reading the rate in the different ways. account.apr has to look in the instance dictionary, not find it there, and then look in the class. pinned.apr finds the rate on the snapshot itself straight away, and the rate method (which has to check for an instance override first) costs a method call. For hot loops, if we don't need per-instance overrides, we can also read the rate from the snapshot once, into a local variable - reading apr is then just a local variable lookup:
+
+from timeit import timeit
+
+account = BankAccount()
+pinned = BankAccount.pin_rates()
+timeit('account.apr', globals=globals(), number=10_000_000)
+#0.3861693560002095
+timeit('pinned.apr', globals=globals(), number=10_000_000)
+#0.15276055699996505
+timeit("account.rate('apr', pinned)", globals=globals(), number=10_000_000)
+#2.0298890659996687
+timeit('apr', setup='apr = BankAccount.pin_rates().apr', globals=globals(), number=10_000_000)
+#0.1300630830000955
+#So reading a rate from a pinned snapshot is not just consistent, it is also more than twice as fast as reading it through an account - almost as fast as a local variable. The rate method is a lot slower (it's a full method call), so it's only worth using where per-instance overrides matter.
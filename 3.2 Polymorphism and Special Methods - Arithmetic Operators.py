@@ -821,3 +821,1234 @@ print(f.children)
 #140460867516680
 #[Person('Eric'), Person('Michael')]
 #So, don't feel restricted to using these operators for numerical use cases only.
+
+# =============================================================================
+# Batch Arithmetic: a VectorArray
+# Every Vector we created above stores its components in its own tuple, and every +, - or * builds a generator and then calls Vector(*components) again - which re-validates every single component.
+#
+# That's fine for a handful of vectors, but if we need to process millions of vectors of the same dimension, the per-object allocation and the repeated validation dominate the run time.
+#
+# Instead, we can store N vectors of the same dimension in one contiguous array('d') buffer (row after row), and implement the same operators so they work across the whole batch in a single call:
+#
+# VectorArray + VectorArray   (or + Vector, which gets applied to every row)
+# VectorArray - VectorArray   (or - Vector)
+# VectorArray * Real          (and Real * VectorArray)
+# VectorArray * VectorArray   dot product of each pair of rows (returns an array('d') of N values)
+# abs(VectorArray)            norm of each row (returns an array('d') of N values)
+# -VectorArray
+#
+# We'll also want to convert to and from lists of Vector objects.
+# =============================================================================
+
+from array import array
+from numbers import Real
+from math import sqrt
+
+class VectorArray:
+    def __init__(self, dimension, data=()):
+        # data is a flat iterable of floats: dimension values per vector, one vector after another
+        if dimension < 1:
+            raise ValueError('Cannot create a VectorArray of empty Vectors.')
+        data = data if isinstance(data, array) and data.typecode == 'd' else array('d', data)
+        if len(data) % dimension:
+            raise ValueError(f'Data length {len(data)} is not a multiple of the dimension {dimension}.')
+        self._dimension = dimension
+        self._data = data
+
+    @classmethod
+    def from_vectors(cls, vectors):
+        vectors = list(vectors)
+        if not vectors:
+            raise ValueError('Cannot create a VectorArray from an empty list - dimension is unknown.')
+        dimension = len(vectors[0])
+        data = array('d')
+        for v in vectors:
+            if len(v) != dimension:
+                raise ValueError(f'All Vectors must have dimension {dimension} - {v} is invalid.')
+            # components were already validated by Vector, so no need to check them again
+            data.extend(v.components)
+        return cls(dimension, data)
+
+    def to_vectors(self):
+        return [Vector(*row) for row in self.rows()]
+
+    @property
+    def dimension(self):
+        return self._dimension
+
+    @property
+    def data(self):
+        return self._data
+
+    def __len__(self):
+        return len(self._data) // self._dimension
+
+    def rows(self):
+        d, data = self._dimension, self._data
+        return (data[i:i + d] for i in range(0, len(data), d))
+
+    def __getitem__(self, index):
+        n = len(self)
+        if index < 0:
+            index += n
+        if not 0 <= index < n:
+            raise IndexError('VectorArray index out of range')
+        start = index * self._dimension
+        return Vector(*self._data[start:start + self._dimension])
+
+    def __repr__(self):
+        return f'VectorArray(dimension={self._dimension}, count={len(self)})'
+
+    def _other_data(self, other):
+        # returns a flat buffer with the same length as ours, or None if the operand is not supported
+        if isinstance(other, VectorArray):
+            if other._dimension == self._dimension and len(other._data) == len(self._data):
+                return other._data
+            return None
+        if isinstance(other, Vector) and len(other) == self._dimension:
+            # broadcast a single Vector to every row
+            return array('d', other.components) * len(self)
+        return None
+
+    def _new(self, data):
+        return VectorArray(self._dimension, data)
+
+    def __add__(self, other):
+        other_data = self._other_data(other)
+        if other_data is None:
+            return NotImplemented
+        return self._new(array('d', map(float.__add__, self._data, other_data)))
+
+    def __radd__(self, other):
+        return self + other
+
+    def __sub__(self, other):
+        other_data = self._other_data(other)
+        if other_data is None:
+            return NotImplemented
+        return self._new(array('d', map(float.__sub__, self._data, other_data)))
+
+    def __rsub__(self, other):
+        other_data = self._other_data(other)
+        if other_data is None:
+            return NotImplemented
+        return self._new(array('d', map(float.__sub__, other_data, self._data)))
+
+    def __mul__(self, other):
+        if isinstance(other, Real):
+            other = float(other)
+            return self._new(array('d', [other * x for x in self._data]))
+        other_data = self._other_data(other)
+        if other_data is None:
+            return NotImplemented
+        # dot product of each pair of rows
+        products = list(map(float.__mul__, self._data, other_data))
+        d = self._dimension
+        return array('d', [sum(products[i:i + d]) for i in range(0, len(products), d)])
+
+    def __rmul__(self, other):
+        return self * other
+
+    def dot(self, other):
+        result = self * other
+        if result is NotImplemented:
+            raise TypeError(f'unsupported operand type(s) for dot: '
+                            f"'{type(self).__name__}' and '{type(other).__name__}'")
+        return result
+
+    def __neg__(self):
+        return self._new(array('d', [-x for x in self._data]))
+
+    def __abs__(self):
+        squares = [x * x for x in self._data]
+        d = self._dimension
+        return array('d', [sqrt(sum(squares[i:i + d])) for i in range(0, len(squares), d)])
+
+vectors = [Vector(1, 2), Vector(3, 4), Vector(5, 6)]
+va = VectorArray.from_vectors(vectors)
+va
+#VectorArray(dimension=2, count=3)
+va.to_vectors()
+#[Vector(1.0, 2.0), Vector(3.0, 4.0), Vector(5.0, 6.0)]
+(va + va).to_vectors()
+#[Vector(2.0, 4.0), Vector(6.0, 8.0), Vector(10.0, 12.0)]
+(va - Vector(1, 1)).to_vectors()
+#[Vector(0.0, 1.0), Vector(2.0, 3.0), Vector(4.0, 5.0)]
+(10 * va).to_vectors()
+#[Vector(10.0, 20.0), Vector(30.0, 40.0), Vector(50.0, 60.0)]
+(-va)[-1]
+#Vector(-5.0, -6.0)
+va * va
+#array('d', [5.0, 25.0, 61.0])
+abs(va)
+#array('d', [2.23606797749979, 5.0, 7.810249675906654])
+#Note that the components come back as floats, since that's how array('d') stores them.
+
+#Mixing dimensions is not supported, just like with Vector:
+
+try:
+    va + VectorArray.from_vectors([Vector(1, 2, 3)])
+except TypeError as ex:
+    print(ex)
+#unsupported operand type(s) for +: 'VectorArray' and 'VectorArray'
+#Let's see how much time we save when we add a million pairs of 3D vectors.
+
+from timeit import timeit
+from random import random
+
+vs_1 = [Vector(random(), random(), random()) for _ in range(1_000_000)]
+vs_2 = [Vector(random(), random(), random()) for _ in range(1_000_000)]
+va_1 = VectorArray.from_vectors(vs_1)
+va_2 = VectorArray.from_vectors(vs_2)
+
+timeit(lambda: [v1 + v2 for v1, v2 in zip(vs_1, vs_2)], number=1)
+#5.791579990999935
+timeit(lambda: va_1 + va_2, number=1)
+#0.5852446110000074
+
+# =============================================================================
+# Skipping re-validation for derived Vectors
+# Our Vector.__init__ checks isinstance(component, Real) for every component. That makes sense when the components come from the outside world, but when we compute the components in __add__, __sub__, __mul__ or __neg__ from Vectors that were already validated, the result is guaranteed to be made of real numbers - so checking them again is wasted work.
+#
+# We can add an internal (hence the underscore) trusted construction path: a class method that creates the instance without calling __init__, and just sets the (already built) components tuple directly. The arithmetic operators then use that instead of Vector(*components).
+# =============================================================================
+
+from numbers import Real
+from math import sqrt
+
+class Vector:
+    def __init__(self, *components):
+        # validate number of components is at least one, and all of them are real numbers
+        if len(components) < 1:
+            raise ValueError('Cannot create an empty Vector.')
+        for component in components:
+            if not isinstance(component, Real):
+                raise ValueError(f'Vector components must all be real numbers - {component} is invalid.')
+
+        # use immutable storage for vector
+        self._components = tuple(components)
+
+    @classmethod
+    def _from_trusted(cls, components):
+        # components must be a non-empty tuple of real numbers - no validation is done here
+        v = cls.__new__(cls)
+        v._components = components
+        return v
+
+    def __len__(self):
+        return len(self._components)
+
+    @property
+    def components(self):
+        return self._components
+
+    def __repr__(self):
+        # works - but unwieldy for high dimension vectors
+        return f'Vector{self._components}'
+
+    def validate_type_and_dimension(self, v):
+        return isinstance(v, Vector) and len(v) == len(self)
+
+    def __add__(self, other):
+        if not self.validate_type_and_dimension(other):
+            return NotImplemented
+        components = tuple(x + y for x, y in zip(self.components, other.components))
+        return Vector._from_trusted(components)
+
+    def __sub__(self, other):
+        if not self.validate_type_and_dimension(other):
+            return NotImplemented
+        components = tuple(x - y for x, y in zip(self.components, other.components))
+        return Vector._from_trusted(components)
+
+    def __mul__(self, other):
+        if isinstance(other, Real):
+            components = tuple(other * x for x in self.components)
+            return Vector._from_trusted(components)
+        if self.validate_type_and_dimension(other):
+            # dot product
+            components = (x * y for x, y in zip(self.components, other.components))
+            return sum(components)
+        return NotImplemented
+
+    def __rmul__(self, other):
+        # for us, multiplication is commutative, so we can leverage our existing __mul__ method
+        return self * other
+
+    def __iadd__(self, other):
+        if self.validate_type_and_dimension(other):
+            components = (x + y for x, y in zip(self.components, other.components))
+            self._components = tuple(components)  # mutating our Vector object
+            return self # don't forget to return the result of the operation!
+        return NotImplemented
+
+    def __neg__(self):
+        components = tuple(-x for x in self.components)
+        return Vector._from_trusted(components)
+
+    def __abs__(self):
+        return sqrt(sum(x ** 2 for x in self.components))
+#(We removed the print statements so they don't swamp the timings below.)
+
+#Validation still happens when we create a Vector directly:
+
+try:
+    Vector(1, 'a')
+except ValueError as ex:
+    print(ex)
+#Vector components must all be real numbers - a is invalid.
+v1 = Vector(1, 2)
+v2 = Vector(10, 20)
+v1 + v2, v1 - v2, 2 * v1, -v1
+#(Vector(11, 22), Vector(-9, -18), Vector(2, 4), Vector(-1, -2))
+#Now let's compare adding two vectors the way our previous __add__ did it (building the result with Vector(*components), i.e. with validation), to using the new __add__, for 2, 3 and 1000 dimensional vectors:
+
+from timeit import timeit
+
+def validated_add(v1, v2):
+    # same as the new __add__, but builds the result with validation
+    if not v1.validate_type_and_dimension(v2):
+        return NotImplemented
+    components = (x + y for x, y in zip(v1.components, v2.components))
+    return Vector(*components)
+
+def compare_add(dimension, number):
+    v1 = Vector(*range(dimension))
+    v2 = Vector(*range(dimension, 2 * dimension))
+    old = timeit(lambda: validated_add(v1, v2), number=number)
+    new = timeit(lambda: Vector.__add__(v1, v2), number=number)
+    print(f'dimension={dimension:>4}: validated={old:.3f}s  trusted={new:.3f}s  speedup={old / new:.2f}x')
+
+compare_add(2, 1_000_000)
+compare_add(3, 1_000_000)
+compare_add(1000, 5_000)
+#dimension=   2: validated=2.647s  trusted=2.120s  speedup=1.25x
+#dimension=   3: validated=3.768s  trusted=2.625s  speedup=1.44x
+#dimension=1000: validated=2.172s  trusted=0.466s  speedup=4.66x
+#The gain grows with the dimension, since the validation loop is the part that scales with the number of components.
+
+# =============================================================================
+# Lazy Evaluation of Chained Arithmetic
+# Even with the trusted construction path, an expression such as:
+#
+# v1 + v2 - v3 * 2 + -v4
+#
+# still creates a temporary Vector (and a temporary tuple) for every intermediate step: v3 * 2, -v4, v1 + v2, then the subtraction, and finally the last addition - five Vectors, of which we only want the last one. For high dimension vectors that's a lot of wasted allocation and looping.
+#
+# Notice that any combination of +, -, unary - and multiplication by a scalar is just a linear combination of the vectors involved:
+#
+# v1 + v2 - v3 * 2 + -v4  ==  1*v1 + 1*v2 + (-2)*v3 + (-1)*v4
+#
+# So instead of computing each step, we can have the operators return an expression node that just records the (coefficient, components) terms. When we finally need the result (when we ask for its components, its repr, its abs, or call eval() explicitly), we compute all the components in a single pass and create a single Vector.
+#
+# We'll use the Vector class we just created (with the _from_trusted class method), and opt in to lazy mode by wrapping a Vector using VectorExpression.from_vector (or the shorter lazy function).
+# =============================================================================
+
+from numbers import Real
+from operator import add, mul
+from itertools import repeat
+
+class VectorExpression:
+    def __init__(self, terms, dimension):
+        # terms is a tuple of (coefficient, components) pairs - the components tuples come from
+        # already validated Vectors, so we don't need to validate anything here
+        self._terms = terms
+        self._dimension = dimension
+        self._result = None
+
+    @classmethod
+    def from_vector(cls, v):
+        return cls(((1, v.components), ), len(v))
+
+    def __len__(self):
+        return self._dimension
+
+    def _terms_of(self, other):
+        # returns the terms of other if it can be combined with self, None otherwise
+        if isinstance(other, VectorExpression) and len(other) == self._dimension:
+            return other._terms
+        if isinstance(other, Vector) and len(other) == self._dimension:
+            return ((1, other.components), )
+        return None
+
+    def __add__(self, other):
+        terms = self._terms_of(other)
+        if terms is None:
+            return NotImplemented
+        return VectorExpression(self._terms + terms, self._dimension)
+
+    def __radd__(self, other):
+        terms = self._terms_of(other)
+        if terms is None:
+            return NotImplemented
+        return VectorExpression(terms + self._terms, self._dimension)
+
+    def __sub__(self, other):
+        terms = self._terms_of(other)
+        if terms is None:
+            return NotImplemented
+        negated = tuple((-c, components) for c, components in terms)
+        return VectorExpression(self._terms + negated, self._dimension)
+
+    def __rsub__(self, other):
+        terms = self._terms_of(other)
+        if terms is None:
+            return NotImplemented
+        negated = tuple((-c, components) for c, components in self._terms)
+        return VectorExpression(terms + negated, self._dimension)
+
+    def __mul__(self, other):
+        if isinstance(other, Real):
+            scaled = tuple((other * c, components) for c, components in self._terms)
+            return VectorExpression(scaled, self._dimension)
+        if self._terms_of(other) is not None:
+            # dot product - we need actual numbers for this
+            if isinstance(other, VectorExpression):
+                other = other.eval()
+            return sum(x * y for x, y in zip(self.components, other.components))
+        return NotImplemented
+
+    def __rmul__(self, other):
+        return self * other
+
+    def __neg__(self):
+        return self * -1
+
+    def eval(self):
+        # chain lazy iterators together, so that tuple() makes a single pass over the
+        # components of all the terms at once, without creating any intermediate tuples
+        if self._result is None:
+            terms = iter(self._terms)
+            c, components = next(terms)
+            result = components if c == 1 else map(mul, repeat(c), components)
+            for c, components in terms:
+                result = map(add, result, components if c == 1 else map(mul, repeat(c), components))
+            self._result = Vector._from_trusted(tuple(result))
+        return self._result
+
+    @property
+    def components(self):
+        return self.eval().components
+
+    def __repr__(self):
+        return repr(self.eval())
+
+    def __abs__(self):
+        return abs(self.eval())
+
+def lazy(v):
+    return VectorExpression.from_vector(v)
+
+v1 = Vector(1, 2)
+v2 = Vector(10, 20)
+v3 = Vector(3, 3)
+v4 = Vector(1, 1)
+v1 + v2 - v3 * 2 + -v4
+#Vector(4, 15)
+#Remember that * and unary - bind tighter than + and -, so v3 * 2 and -v4 would be computed (eagerly) before they are combined with anything else. To keep the whole thing lazy we wrap those vectors too:
+
+expr = lazy(v1) + v2 - lazy(v3) * 2 + -lazy(v4)
+type(expr)
+#__main__.VectorExpression
+#Nothing has been computed yet - the expression just holds on to the terms:
+
+expr._terms
+#((1, (1, 2)), (1, (10, 20)), (-2, (3, 3)), (-1, (1, 1)))
+expr
+#Vector(4, 15)
+expr.eval()
+#Vector(4, 15)
+abs(expr)
+#15.524174696260024
+#Note that the expression captures the components tuples (not the Vector objects), so it has the same semantics as eager evaluation, even if one of the vectors gets mutated in place afterwards with +=.
+
+#And since scalar multiplication simply scales the coefficients, something like this still results in a single pass:
+
+2 * (lazy(v1) - v2) + v3
+#Vector(-15, -33)
+#Let's compare the timings for 1000 dimensional vectors:
+
+from timeit import timeit
+
+w1 = Vector(*range(1000))
+w2 = Vector(*range(1000, 2000))
+w3 = Vector(*range(2000, 3000))
+w4 = Vector(*range(3000, 4000))
+
+timeit(lambda: w1 + w2 - w3 * 2 + -w4, number=5_000)
+#1.6852308259999518
+timeit(lambda: (lazy(w1) + w2 - lazy(w3) * 2 + -lazy(w4)).eval(), number=5_000)
+#1.305985132999922
+
+# =============================================================================
+# Implementing the @ Operator
+# Earlier our __matmul__ just printed a message and returned None. Let's implement it properly:
+#
+# Vector @ Vector  -> the dot product (a Real number)
+#
+# and let's add a companion Matrix class so we can also do:
+#
+# Matrix @ Vector  -> Vector
+# Vector @ Matrix  -> Vector (the vector is treated as a row vector)
+# Matrix @ Matrix  -> Matrix
+#
+# Since Vector.__matmul__ returns NotImplemented when the right operand is a Matrix, Python will call Matrix.__rmatmul__ for Vector @ Matrix - so the Vector class does not even need to know about matrices.
+#
+# For the Matrix @ Matrix product we transpose the right operand once, so its columns become tuples we can combine with each row of the left operand using sum(map(mul, row, column)) - that keeps the inner loop in C, instead of indexing into b_rows[k][j] one element at a time.
+#
+# If NumPy is installed, large Matrix @ Matrix products of floats are handed off to it instead, since its vectorized kernels will always beat pure Python loops. We don't do that for:
+# - matrices that contain ints (or other non-float numbers) - NumPy would convert them to floats, so the type of the result (and its exactness, for large ints) would depend on the size of the matrix, and on whether NumPy is installed
+# - Matrix @ Vector and Vector @ Matrix - converting the matrix to a NumPy array is O(n^2), just like the product itself, so it would cost about as much as the work it saves
+# =============================================================================
+
+from numbers import Real
+from math import sqrt
+from operator import mul
+
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+class Vector:
+    def __init__(self, *components):
+        # validate number of components is at least one, and all of them are real numbers
+        if len(components) < 1:
+            raise ValueError('Cannot create an empty Vector.')
+        for component in components:
+            if not isinstance(component, Real):
+                raise ValueError(f'Vector components must all be real numbers - {component} is invalid.')
+
+        # use immutable storage for vector
+        self._components = tuple(components)
+        # the norm is computed the first time abs is called (see Caching the Norm below)
+        self._norm = None
+
+    @classmethod
+    def _from_trusted(cls, components):
+        # components must be a non-empty tuple of real numbers - no validation is done here
+        v = cls.__new__(cls)
+        v._components = components
+        v._norm = None
+        return v
+
+    def __len__(self):
+        return len(self._components)
+
+    @property
+    def components(self):
+        return self._components
+
+    def __repr__(self):
+        # works - but unwieldy for high dimension vectors
+        return f'Vector{self._components}'
+
+    def validate_type_and_dimension(self, v):
+        return isinstance(v, Vector) and len(v) == len(self)
+
+    def __add__(self, other):
+        if not self.validate_type_and_dimension(other):
+            return NotImplemented
+        components = tuple(x + y for x, y in zip(self.components, other.components))
+        return Vector._from_trusted(components)
+
+    def __sub__(self, other):
+        if not self.validate_type_and_dimension(other):
+            return NotImplemented
+        components = tuple(x - y for x, y in zip(self.components, other.components))
+        return Vector._from_trusted(components)
+
+    def __mul__(self, other):
+        if isinstance(other, Real):
+            components = tuple(other * x for x in self.components)
+            return Vector._from_trusted(components)
+        if self.validate_type_and_dimension(other):
+            # dot product
+            return sum(map(mul, self.components, other.components))
+        return NotImplemented
+
+    def __rmul__(self, other):
+        # for us, multiplication is commutative, so we can leverage our existing __mul__ method
+        return self * other
+
+    def __matmul__(self, other):
+        if self.validate_type_and_dimension(other):
+            # dot product
+            return sum(map(mul, self.components, other.components))
+        return NotImplemented
+
+    def __iadd__(self, other):
+        if self.validate_type_and_dimension(other):
+            components = (x + y for x, y in zip(self.components, other.components))
+            self._components = tuple(components)  # mutating our Vector object
+            self._norm = None  # the cached norm is no longer valid
+            return self # don't forget to return the result of the operation!
+        return NotImplemented
+
+    def __neg__(self):
+        components = tuple(-x for x in self.components)
+        return Vector._from_trusted(components)
+
+    def norm_squared(self):
+        return sum(x * x for x in self.components)
+
+    def __abs__(self):
+        if self._norm is None:
+            self._norm = sqrt(self.norm_squared())
+        return self._norm
+
+
+class Matrix:
+    # use NumPy (if installed) for Matrix @ Matrix products of floats,
+    # once rows * columns * inner dimension reaches this many multiplications
+    numpy_threshold = 32_768
+
+    def __init__(self, *rows):
+        # validate we have at least one row, all rows have the same (non-zero) length,
+        # and all the elements are real numbers
+        if len(rows) < 1 or len(rows[0]) < 1:
+            raise ValueError('Cannot create an empty Matrix.')
+        columns = len(rows[0])
+        for row in rows:
+            if len(row) != columns:
+                raise ValueError(f'Matrix rows must all have {columns} elements - {row} is invalid.')
+            for element in row:
+                if not isinstance(element, Real):
+                    raise ValueError(f'Matrix elements must all be real numbers - {element} is invalid.')
+
+        # use immutable storage for the matrix
+        self._rows = tuple(tuple(row) for row in rows)
+
+    @classmethod
+    def _from_trusted(cls, rows):
+        # rows must be a non-empty tuple of same length tuples of real numbers - no validation is done here
+        m = cls.__new__(cls)
+        m._rows = rows
+        return m
+
+    @property
+    def rows(self):
+        return self._rows
+
+    @property
+    def shape(self):
+        return len(self._rows), len(self._rows[0])
+
+    def transpose(self):
+        return Matrix._from_trusted(tuple(zip(*self._rows)))
+
+    def __repr__(self):
+        return f'Matrix{self._rows}'
+
+    def __eq__(self, other):
+        if isinstance(other, Matrix):
+            return self._rows == other._rows
+        return NotImplemented
+
+    def _all_floats(self):
+        return all(isinstance(element, float) for row in self._rows for element in row)
+
+    def _use_numpy(self, other, n_rows, n_inner, n_columns):
+        # NumPy would convert ints to floats - so only use it for floats, to keep the result the same
+        return (np is not None and n_rows * n_inner * n_columns >= Matrix.numpy_threshold
+                and self._all_floats() and other._all_floats())
+
+    def __matmul__(self, other):
+        n_rows, n_inner = self.shape
+        if isinstance(other, Vector) and len(other) == n_inner:
+            v = other.components
+            return Vector._from_trusted(tuple(sum(map(mul, row, v)) for row in self._rows))
+        if isinstance(other, Matrix) and other.shape[0] == n_inner:
+            n_columns = other.shape[1]
+            if self._use_numpy(other, n_rows, n_inner, n_columns):
+                result = np.array(self._rows) @ np.array(other._rows)
+                return Matrix._from_trusted(tuple(map(tuple, result.tolist())))
+            return Matrix._from_trusted(_matmul(self._rows, other._rows))
+        return NotImplemented
+
+    def __rmatmul__(self, other):
+        # Vector @ Matrix: treat the vector as a row vector
+        n_rows, n_columns = self.shape
+        if isinstance(other, Vector) and len(other) == n_rows:
+            v = other.components
+            return Vector._from_trusted(tuple(sum(map(mul, v, column)) for column in zip(*self._rows)))
+        return NotImplemented
+
+
+def _matmul(a_rows, b_rows):
+    # transpose b once, so each column is a tuple we can zip against a row of a
+    b_columns = tuple(zip(*b_rows))
+    return tuple(tuple(sum(map(mul, row, column)) for column in b_columns) for row in a_rows)
+
+v1 = Vector(1, 2)
+v2 = Vector(3, 4)
+v1 @ v2
+#11
+m = Matrix((1, 2), (3, 4), (5, 6))
+m.shape
+#(3, 2)
+m @ v1
+#Vector(5, 11, 17)
+Vector(1, 1, 1) @ m
+#Vector(9, 12)
+m @ m.transpose()
+#Matrix((5, 11, 17), (11, 25, 39), (17, 39, 61))
+#And just like with the other arithmetic operators, incompatible dimensions are not supported:
+
+try:
+    m @ Vector(1, 2, 3)
+except TypeError as ex:
+    print(ex)
+#unsupported operand type(s) for @: 'Matrix' and 'Vector'
+try:
+    m @ m
+except TypeError as ex:
+    print(ex)
+#unsupported operand type(s) for @: 'Matrix' and 'Matrix'
+#Let's compare our kernel with a naive triple loop for a 200 x 200 matrix product (without NumPy):
+
+from timeit import timeit
+from random import random
+
+def naive_matmul(a_rows, b_rows):
+    n_inner, n_columns = len(b_rows), len(b_rows[0])
+    return tuple(
+        tuple(sum(a_row[k] * b_rows[k][j] for k in range(n_inner)) for j in range(n_columns))
+        for a_row in a_rows
+    )
+
+a = Matrix(*[[random() for _ in range(200)] for _ in range(200)])
+b = Matrix(*[[random() for _ in range(200)] for _ in range(200)])
+
+timeit(lambda: naive_matmul(a.rows, b.rows), number=1)
+#0.7237922389995219
+timeit(lambda: _matmul(a.rows, b.rows), number=1)
+#0.36809267599983286
+#(What about splitting the product into square blocks, so the rows and columns being combined stay in the CPU caches? That's what fast matrix libraries do - but in pure Python every element is a separate float object somewhere on the heap anyway, so there is no contiguous memory for the blocks to keep in cache. When we tried it, a blocked version of this kernel (64 x 64 blocks) was actually about 20% slower, because of all the extra slicing and bookkeeping.)
+
+#And ints stay ints (and exact), whatever the size of the matrices:
+
+big = Matrix(*[[10 ** 20 + i for i in range(40)] for _ in range(40)])
+product = big @ big
+type(product.rows[0][0]), product.rows[0][0] == sum((10 ** 20 + k) * (10 ** 20) for k in range(40))
+#(<class 'int'>, True)
+
+# =============================================================================
+# True In-Place Mutation
+# Our "mutating" __iadd__ still builds a brand new tuple every time (self._components = tuple(components)) - we mutate the Vector object, but not its storage. So a loop such as:
+#
+# total = Vector(0, 0, 0)
+# for v in vectors:
+#     total += v
+#
+# allocates a new tuple (and a generator) on every single step.
+#
+# If we want to genuinely update the components in place, we need mutable storage. An array('d') is a good fit - it stores the floats in one contiguous buffer, and we can update its elements in place.
+#
+# Let's create a MutableVector variant of our Vector class (the one with __matmul__ we just wrote). Since it is a subclass, it still passes validate_type_and_dimension, so it interoperates with regular Vectors. Its in-place operators (+=, -=, *= and /=) write directly into the existing buffer without allocating a new one, while the regular operators (inherited from Vector) still return new, immutable Vectors.
+#
+# The components property still returns an immutable tuple (a snapshot of the array), so code that holds on to the components of a vector is not affected by later in-place changes - the array itself is available through a separate storage property.
+# =============================================================================
+
+from array import array
+from numbers import Real
+
+class MutableVector(Vector):
+    def __init__(self, *components):
+        super().__init__(*components)
+        # use mutable storage for vector
+        self._components = array('d', self._components)
+
+    @property
+    def components(self):
+        # still an immutable snapshot, just like for a Vector - anything holding on to the
+        # components (a VectorExpression for example) must not see later in-place changes
+        return tuple(self._components)
+
+    @property
+    def storage(self):
+        # the mutable array itself
+        return self._components
+
+    def __repr__(self):
+        return f'MutableVector{tuple(self._components)}'
+
+    def __abs__(self):
+        # the storage can be changed from the outside (through storage, or a buffer we share),
+        # so a cached norm could silently go stale - always recompute it
+        return sqrt(self.norm_squared())
+
+    def __iadd__(self, other):
+        if self.validate_type_and_dimension(other):
+            buffer, other_components = self._components, other.components
+            for i in range(len(buffer)):
+                buffer[i] += other_components[i]
+            return self
+        return NotImplemented
+
+    def __isub__(self, other):
+        if self.validate_type_and_dimension(other):
+            buffer, other_components = self._components, other.components
+            for i in range(len(buffer)):
+                buffer[i] -= other_components[i]
+            return self
+        return NotImplemented
+
+    def __imul__(self, other):
+        if isinstance(other, Real):
+            buffer = self._components
+            for i in range(len(buffer)):
+                buffer[i] *= other
+            return self
+        return NotImplemented
+
+    def __itruediv__(self, other):
+        if isinstance(other, Real):
+            buffer = self._components
+            for i in range(len(buffer)):
+                buffer[i] /= other
+            return self
+        return NotImplemented
+
+total = MutableVector(0, 0)
+buffer_id = id(total.storage)
+total += Vector(1, 2)
+total += MutableVector(10, 20)
+total -= Vector(1, 1)
+total
+#MutableVector(10.0, 21.0)
+total *= 2
+total /= 4
+total
+#MutableVector(5.0, 10.5)
+id(total.storage) == buffer_id
+#True
+#The storage buffer is the same object we started with.
+
+#But the components are still an immutable snapshot - so a lazy expression keeps the same (eager) semantics as with a Vector, even if the vector is changed in place afterwards:
+
+m = MutableVector(1, 2)
+e = lazy(m) + Vector(0, 0)
+m += Vector(10, 10)
+e, m
+#(Vector(1.0, 2.0), MutableVector(11.0, 12.0))
+
+#The regular operators still return new (immutable) Vectors:
+
+total + Vector(1, 1)
+#Vector(6.0, 11.5)
+#Let's compare accumulating one million 3D vectors into a Vector and a MutableVector:
+
+from timeit import timeit
+from random import random
+
+vectors = [Vector(random(), random(), random()) for _ in range(1_000_000)]
+
+def accumulate(total):
+    for v in vectors:
+        total += v
+    return total
+
+timeit(lambda: accumulate(Vector(0, 0, 0)), number=1)
+#1.9423264019997077
+timeit(lambda: accumulate(MutableVector(0, 0, 0)), number=1)
+#1.315896013999918
+
+# =============================================================================
+# Exposing the Components through the Buffer Protocol
+# When we hand vector data to NumPy, the struct module, or write it to a socket, going through the components tuple always means converting and copying the data first.
+#
+# Objects such as bytes, bytearray, array and NumPy arrays avoid this by supporting the buffer protocol: they expose a pointer to their underlying memory, so memoryview(obj), numpy.frombuffer(obj) or sock.sendall(obj) can read the data directly, without any copying.
+#
+# Since Python 3.12 (PEP 688) our own classes can support the buffer protocol too, by implementing the __buffer__ special method. Our MutableVector already stores its components in a contiguous array('d') of float64 values, so all __buffer__ needs to do is return a memoryview of that array.
+#
+# We'll also add a frombuffer class method to do the reverse. If the buffer is writable, the vector simply uses a float64 view of that memory as its storage (no copy) - so in-place operations write straight into the original buffer. If it is read-only (bytes for example), we have to copy it into a new array.
+#
+# Before Python 3.12, __buffer__ is just an ordinary method that nothing calls - memoryview(v) raises a TypeError, and socket.sendall(v) will not accept the vector. So we also expose the same memoryview through a buffer property, that works on every version, and use that below.
+# =============================================================================
+
+from array import array
+from numbers import Real
+
+class MutableVector(Vector):
+    def __init__(self, *components):
+        super().__init__(*components)
+        # use mutable storage for vector
+        self._components = array('d', self._components)
+
+    @classmethod
+    def frombuffer(cls, buffer):
+        view = memoryview(buffer).cast('B')
+        if len(view) == 0 or len(view) % 8:
+            raise ValueError(f'Buffer size must be a non-zero multiple of 8 bytes - got {len(view)}.')
+        v = cls.__new__(cls)
+        if view.readonly:
+            v._components = array('d', view.tobytes())
+        else:
+            # share the memory of the buffer - no copy
+            v._components = view.cast('d')
+        return v
+
+    @property
+    def components(self):
+        # still an immutable snapshot, just like for a Vector - anything holding on to the
+        # components (a VectorExpression for example) must not see later in-place changes
+        return tuple(self._components)
+
+    @property
+    def storage(self):
+        # the mutable array (or the float64 view of the buffer we were created from)
+        return self._components
+
+    @property
+    def buffer(self):
+        return memoryview(self._components)
+
+    def __buffer__(self, flags):
+        return memoryview(self._components)
+
+    def __repr__(self):
+        return f'MutableVector{tuple(self._components)}'
+
+    def __abs__(self):
+        # the storage can be changed from the outside (through storage, or a buffer we share),
+        # so a cached norm could silently go stale - always recompute it
+        return sqrt(self.norm_squared())
+
+    def __iadd__(self, other):
+        if self.validate_type_and_dimension(other):
+            buffer, other_components = self._components, other.components
+            for i in range(len(buffer)):
+                buffer[i] += other_components[i]
+            return self
+        return NotImplemented
+
+    def __isub__(self, other):
+        if self.validate_type_and_dimension(other):
+            buffer, other_components = self._components, other.components
+            for i in range(len(buffer)):
+                buffer[i] -= other_components[i]
+            return self
+        return NotImplemented
+
+    def __imul__(self, other):
+        if isinstance(other, Real):
+            buffer = self._components
+            for i in range(len(buffer)):
+                buffer[i] *= other
+            return self
+        return NotImplemented
+
+    def __itruediv__(self, other):
+        if isinstance(other, Real):
+            buffer = self._components
+            for i in range(len(buffer)):
+                buffer[i] /= other
+            return self
+        return NotImplemented
+
+v = MutableVector(1, 2, 3)
+m = v.buffer
+m.format, m.itemsize, m.nbytes, m.contiguous
+#('d', 8, 24, True)
+m.tolist()
+#[1.0, 2.0, 3.0]
+#The memoryview does not copy anything, so it sees changes we make to the vector:
+
+v *= 10
+m.tolist()
+#[10.0, 20.0, 30.0]
+#Anything that accepts a bytes-like object can now consume the vector directly:
+
+import struct
+
+struct.unpack('3d', v.buffer)
+#(10.0, 20.0, 30.0)
+bytes(v.buffer)[:8]
+#b'\x00\x00\x00\x00\x00\x00$@'
+import socket
+
+sender, receiver = socket.socketpair()
+sender.settimeout(5)
+receiver.settimeout(5)
+try:
+    sender.sendall(v.buffer)
+    data = receiver.recv(1024)
+finally:
+    sender.close()
+    receiver.close()
+MutableVector.frombuffer(data)
+#MutableVector(10.0, 20.0, 30.0)
+#On Python 3.12+, __buffer__ gets called for us, so we can pass the vector itself anywhere a bytes-like object is expected:
+
+import sys
+
+if sys.version_info >= (3, 12):
+    print(memoryview(v).tolist(), struct.unpack('3d', v), bytes(v) == bytes(v.buffer))
+#[10.0, 20.0, 30.0] (10.0, 20.0, 30.0) True
+#NumPy works the same way: numpy.frombuffer(v) returns a float64 array that shares the vector's memory.
+
+#When we create a vector from a writable buffer, the vector and the buffer share the same memory:
+
+raw = bytearray(struct.pack('2d', 1.5, 2.5))
+w = MutableVector.frombuffer(raw)
+w += Vector(1, 1)
+struct.unpack('2d', raw)
+#(2.5, 3.5)
+try:
+    MutableVector.frombuffer(b'abc')
+except ValueError as ex:
+    print(ex)
+#Buffer size must be a non-zero multiple of 8 bytes - got 3.
+
+# =============================================================================
+# Sparse Vectors
+# For very high dimension vectors (think 100,000+ dimensional feature vectors) that are mostly zeros, storing every component in a tuple wastes a lot of memory, and __add__ or __mul__ (which zip over every component) waste a lot of time adding and multiplying zeros.
+#
+# Instead, we can store only the non-zero components in a dictionary mapping index -> value, and implement the operations so they only loop over those non-zero entries - O(nnz) (number of non-zeros) instead of O(n).
+#
+# To interoperate with our Vector class, a SparseVector needs to pass validate_type_and_dimension - so we make it a subclass of Vector with the right length. But then we need to be careful: Vector's own operators zip over the components of both operands, so a dense Vector + SparseVector would densify the sparse one. Fortunately, Python has a rule for exactly this situation: if the right operand is an instance of a subclass of the left operand's type, and it provides a different reflected method, Python calls the reflected method of the right operand first. So Vector + SparseVector ends up calling SparseVector.__radd__, and we get to decide how it's done.
+#
+# Results:
+# SparseVector +/- SparseVector   -> SparseVector (O(nnz))
+# SparseVector +/- Vector         -> Vector (the result is dense anyway)
+# SparseVector * Real             -> SparseVector
+# SparseVector * Vector (dot)     -> Real (O(nnz) either way)
+# abs(SparseVector)               -> Real (O(nnz))
+#
+# And we only build a dense Vector when explicitly asked for, with the to_dense method.
+# =============================================================================
+
+from numbers import Real
+from math import sqrt
+
+class SparseVector(Vector):
+    def __init__(self, dimension, nonzeros=None):
+        # nonzeros is a mapping (or an iterable of pairs) of index -> value
+        if dimension < 1:
+            raise ValueError('Cannot create an empty Vector.')
+        entries = {}
+        for index, value in dict(nonzeros or {}).items():
+            if not isinstance(index, int) or not 0 <= index < dimension:
+                raise ValueError(f'SparseVector index must be an integer in range({dimension}) - {index} is invalid.')
+            if not isinstance(value, Real):
+                raise ValueError(f'Vector components must all be real numbers - {value} is invalid.')
+            if value:
+                entries[index] = value
+        self._dimension = dimension
+        self._entries = entries
+
+    @classmethod
+    def _from_trusted(cls, dimension, entries):
+        # entries must be a dict of valid index -> non-zero real number - no validation is done here
+        v = cls.__new__(cls)
+        v._dimension = dimension
+        v._entries = entries
+        return v
+
+    @classmethod
+    def from_vector(cls, v):
+        entries = {i: x for i, x in enumerate(v.components) if x}
+        return cls._from_trusted(len(v), entries)
+
+    def __len__(self):
+        return self._dimension
+
+    @property
+    def nonzeros(self):
+        return dict(self._entries)
+
+    @property
+    def components(self):
+        # a SparseVector is still a Vector, so this has to work - but it's O(n)
+        return self.to_dense().components
+
+    def to_dense(self):
+        components = [0] * self._dimension
+        for i, x in self._entries.items():
+            components[i] = x
+        return Vector._from_trusted(tuple(components))
+
+    def __repr__(self):
+        return f'SparseVector({self._dimension}, {self._entries})'
+
+    def _combine(self, other, sign):
+        # self + sign * other
+        if isinstance(other, SparseVector):
+            entries = dict(self._entries)
+            for i, y in other._entries.items():
+                x = entries.get(i, 0) + sign * y
+                if x:
+                    entries[i] = x
+                else:
+                    entries.pop(i, None)
+            return SparseVector._from_trusted(self._dimension, entries)
+        components = [sign * y for y in other.components]
+        for i, x in self._entries.items():
+            components[i] += x
+        return Vector._from_trusted(tuple(components))
+
+    def __add__(self, other):
+        if not self.validate_type_and_dimension(other):
+            return NotImplemented
+        return self._combine(other, 1)
+
+    def __radd__(self, other):
+        return self + other
+
+    def __sub__(self, other):
+        if not self.validate_type_and_dimension(other):
+            return NotImplemented
+        return self._combine(other, -1)
+
+    def __rsub__(self, other):
+        if not self.validate_type_and_dimension(other):
+            return NotImplemented
+        # other - self == -(self - other)
+        return -self._combine(other, -1)
+
+    def __mul__(self, other):
+        if isinstance(other, Real):
+            if not other:
+                return SparseVector._from_trusted(self._dimension, {})
+            entries = {i: other * x for i, x in self._entries.items()}
+            return SparseVector._from_trusted(self._dimension, entries)
+        if self.validate_type_and_dimension(other):
+            # dot product - only indices that are non-zero in self can contribute
+            if isinstance(other, SparseVector):
+                a, b = self._entries, other._entries
+                if len(b) < len(a):
+                    a, b = b, a
+                return sum(x * b[i] for i, x in a.items() if i in b)
+            other_components = other.components
+            return sum(x * other_components[i] for i, x in self._entries.items())
+        return NotImplemented
+
+    def __rmul__(self, other):
+        return self * other
+
+    def __matmul__(self, other):
+        if self.validate_type_and_dimension(other):
+            return self * other
+        return NotImplemented
+
+    def __rmatmul__(self, other):
+        return self.__matmul__(other)
+
+    def __iadd__(self, other):
+        # a sparse vector can't hold a dense result in place - fall back to + (returning a new object)
+        return NotImplemented
+
+    def __neg__(self):
+        return SparseVector._from_trusted(self._dimension, {i: -x for i, x in self._entries.items()})
+
+    def norm_squared(self):
+        return sum(x * x for x in self._entries.values())
+
+    def __abs__(self):
+        # O(nnz), and a SparseVector is never mutated - no need for a cache
+        return sqrt(self.norm_squared())
+
+s1 = SparseVector(100_000, {0: 1, 500: 2, 99_999: 3})
+s2 = SparseVector(100_000, {500: -2, 1_000: 5})
+s1 + s2
+#SparseVector(100000, {0: 1, 99999: 3, 1000: 5})
+s1 - s2
+#SparseVector(100000, {0: 1, 500: 4, 99999: 3, 1000: -5})
+2 * s1
+#SparseVector(100000, {0: 2, 500: 4, 99999: 6})
+s1 * s2, s1 @ s2
+#(-4, -4)
+abs(s1)
+#3.7416573867739413
+#Mixing sparse and dense vectors works too, and since dense + sparse is dense, we get a Vector back:
+
+d = Vector(*range(100_000))
+type(d + s1), type(s1 + d)
+#(__main__.Vector, __main__.Vector)
+(d + s1).components[:3], (d - s1).components[:3]
+#((1, 1, 2), (-1, 1, 2))
+d * s1 == s1 * d == 1 * 0 + 2 * 500 + 3 * 99_999
+#True
+#The dense version is only built when we ask for it:
+
+s1.to_dense().components[498:502]
+#(0, 0, 2, 0)
+SparseVector.from_vector(Vector(0, 0, 7, 0))
+#SparseVector(4, {2: 7})
+#And of course mismatched dimensions are not supported:
+
+try:
+    s1 + SparseVector(10)
+except TypeError as ex:
+    print(ex)
+#unsupported operand type(s) for +: 'SparseVector' and 'SparseVector'
+#Let's compare adding and dotting two 100,000 dimensional vectors with 100 non-zero entries each:
+
+from timeit import timeit
+from random import random, sample
+
+n = 100_000
+sparse_1 = SparseVector(n, {i: random() for i in sample(range(n), 100)})
+sparse_2 = SparseVector(n, {i: random() for i in sample(range(n), 100)})
+dense_1, dense_2 = sparse_1.to_dense(), sparse_2.to_dense()
+
+timeit(lambda: dense_1 + dense_2, number=100)
+#0.794660446999842
+timeit(lambda: sparse_1 + sparse_2, number=100)
+#0.0024078379997263255
+timeit(lambda: dense_1 * dense_2, number=100)
+#0.46911398099973667
+timeit(lambda: sparse_1 * sparse_2, number=100)
+#0.0005920280000282219
+
+# =============================================================================
+# Caching the Norm
+# Our __abs__ recomputes sqrt(sum(x ** 2 ...)) every time it is called - for a high dimension vector that's a full pass over the components, even though the result can only change when the vector itself changes.
+#
+# Since our Vector is immutable except for the in-place addition, we can compute the norm the first time abs is called, cache it in the instance, and just reset the cache whenever __iadd__ mutates the components.
+#
+# We'll also add a norm_squared method - when all we need is to compare lengths (as we'll do with the rich comparison operators), comparing the squared norms gives the same answer without needing a square root at all.
+#
+# If we redefined Vector here, MutableVector and SparseVector would still be subclasses of the old class, and would no longer pass validate_type_and_dimension of the new one - so instead, the caching lives in the Vector class we wrote for the @ operator (have a look at __init__, _from_trusted, __iadd__, norm_squared and __abs__), and the subclasses adapt it:
+# - MutableVector never caches the norm: its storage can be changed in place, through the storage property, or through a buffer it shares memory with, so a cached value could go stale without us knowing
+# - SparseVector overrides norm_squared to only loop over the non-zero entries
+# =============================================================================
+
+v1 = Vector(*range(1000))
+v1._norm is None
+#True
+abs(v1)
+#18243.72494859534
+v1._norm
+#18243.72494859534
+v1 += Vector(*[1] * 1000)
+v1._norm is None
+#True
+abs(v1)
+#18271.111077326415
+v1.norm_squared()
+#333833500
+#Derived vectors start out with an empty cache as well:
+
+(-v1)._norm is None
+#True
+#And the subclasses still work together with Vector:
+
+m = MutableVector(3, 4)
+abs(m)
+#5.0
+m *= 2
+abs(m), m.norm_squared()
+#(10.0, 100.0)
+abs(s1), s1.norm_squared()
+#(3.7416573867739413, 14)
+type(s1 + s2), s1 * s2, type(Vector(1, 2) + MutableVector(3, 4))
+#(__main__.SparseVector, -4, __main__.Vector)
+from timeit import timeit
+
+v = Vector(*range(1000))
+timeit(lambda: sqrt(sum(x ** 2 for x in v.components)), number=10_000)
+#1.1074927370000296
+timeit(lambda: abs(v), number=10_000)
+#0.0014293590002125711
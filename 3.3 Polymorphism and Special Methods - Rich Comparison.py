@@ -315,3 +315,182 @@ a <= c
 # True
 # =============================================================================
 #One thing I want to point out, according to the documentation the __eq__ is not actually required. That's because as we saw earlier, all objects have a default implementation for == based on the memory address. That's usually not what we want, so we normally end up defining a custom __eq__ implementation as well.
+
+# =============================================================================
+# Caching the Norm
+# Our __lt__ calls abs on both operands for every single comparison. If we sort N vectors, that's roughly 2 * N * log(N) square roots - even though each vector's length only changes when its x or y changes.
+#
+# So let's cache the length in the instance. To make sure the cache never goes stale, we make x and y properties whose setters reset the cache.
+#
+# We also notice that we don't actually need the square root to compare lengths: for non-negative numbers, a < b exactly when a ** 2 < b ** 2. So we add a norm_squared method and use that in the comparisons instead of abs.
+# =============================================================================
+
+from math import sqrt
+
+class Vector:
+    def __init__(self, x, y):
+        self.x = x
+        self.y = y
+
+    @property
+    def x(self):
+        return self._x
+
+    @x.setter
+    def x(self, value):
+        self._x = value
+        self._norm = None
+
+    @property
+    def y(self):
+        return self._y
+
+    @y.setter
+    def y(self, value):
+        self._y = value
+        self._norm = None
+
+    def __repr__(self):
+        return f'Vector(x={self.x}, y={self.y})'
+
+    def __eq__(self, other):
+        if isinstance(other, tuple):
+            other = Vector(*other)
+        if isinstance(other, Vector):
+            return self.x == other.x and self.y == other.y
+        return NotImplemented
+
+    def norm_squared(self):
+        return self._x * self._x + self._y * self._y
+
+    def __abs__(self):
+        if self._norm is None:
+            self._norm = sqrt(self.norm_squared())
+        return self._norm
+
+    def __lt__(self, other):
+        if isinstance(other, tuple):
+            other = Vector(*other)
+        if isinstance(other, Vector):
+            return self.norm_squared() < other.norm_squared()
+        return NotImplemented
+
+    def __le__(self, other):
+        return self == other or self < other
+v1 = Vector(3, 4)
+abs(v1), v1._norm
+#(5.0, 5.0)
+v1.x = 6
+v1._norm is None
+#True
+abs(v1)
+#7.211102550927978
+#The comparisons behave exactly as before:
+
+v1 = Vector(0, 0)
+v2 = Vector(1, 1)
+v1 < v2, v2 > v1, v1 <= (0.5, 0.5), v1 >= v2
+#(True, True, True, False)
+#And sorting never needs a single square root:
+
+sorted([Vector(3, 4), Vector(1, 1), Vector(0, 2)])
+#[Vector(x=1, y=1), Vector(x=0, y=2), Vector(x=3, y=4)]
+
+# =============================================================================
+# Sorting Vectors by Magnitude
+# When we sort a list of Vectors, sorted calls __lt__ for every comparison - that's about N * log(N) calls, each one doing isinstance checks, maybe converting a tuple to a Vector, and computing the squared norm of both operands.
+#
+# But each vector's magnitude only needs to be computed once: we can ask sorted to compute a sort key for each element up front (that's the classic decorate-sort-undecorate pattern - the key function does the decorating for us), and then the comparisons are just comparisons between numbers, done entirely in C.
+#
+# Since Python's sort is stable, and our __lt__ compares squared norms, sorting with key=Vector.norm_squared produces exactly the same order as sorting with the rich comparisons - including the relative order of vectors that have the same magnitude.
+# =============================================================================
+
+from math import sqrt
+
+class Vector:
+    def __init__(self, x, y):
+        self.x = x
+        self.y = y
+
+    @property
+    def x(self):
+        return self._x
+
+    @x.setter
+    def x(self, value):
+        self._x = value
+        self._norm = None
+
+    @property
+    def y(self):
+        return self._y
+
+    @y.setter
+    def y(self, value):
+        self._y = value
+        self._norm = None
+
+    def __repr__(self):
+        return f'Vector(x={self.x}, y={self.y})'
+
+    def __eq__(self, other):
+        if isinstance(other, tuple):
+            other = Vector(*other)
+        if isinstance(other, Vector):
+            return self.x == other.x and self.y == other.y
+        return NotImplemented
+
+    def norm_squared(self):
+        return self._x * self._x + self._y * self._y
+
+    def __abs__(self):
+        if self._norm is None:
+            self._norm = sqrt(self.norm_squared())
+        return self._norm
+
+    def __lt__(self, other):
+        if isinstance(other, tuple):
+            other = Vector(*other)
+        if isinstance(other, Vector):
+            return self.norm_squared() < other.norm_squared()
+        return NotImplemented
+
+    def __le__(self, other):
+        return self == other or self < other
+
+    @classmethod
+    def sort_by_magnitude(cls, vectors, reverse=False):
+        # tuples are converted to Vectors, just like the comparison operators do
+        vectors = [v if isinstance(v, cls) else cls(*v) for v in vectors]
+        # sorting is stable, so vectors of equal magnitude stay in their original order,
+        # exactly like they would when sorted using the < operator
+        return sorted(vectors, key=cls.norm_squared, reverse=reverse)
+vectors = [Vector(3, 4), Vector(0, 2), Vector(-4, 3), Vector(1, 1), Vector(5, 0)]
+Vector.sort_by_magnitude(vectors)
+#[Vector(x=1, y=1), Vector(x=0, y=2), Vector(x=3, y=4), Vector(x=-4, y=3), Vector(x=5, y=0)]
+sorted(vectors) == Vector.sort_by_magnitude(vectors)
+#True
+Vector.sort_by_magnitude(vectors, reverse=True)
+#[Vector(x=3, y=4), Vector(x=-4, y=3), Vector(x=5, y=0), Vector(x=0, y=2), Vector(x=1, y=1)]
+#Just like with the comparison operators, tuples are accepted too (and returned as Vectors):
+
+Vector.sort_by_magnitude([(3, 4), (1, 1)])
+#[Vector(x=1, y=1), Vector(x=3, y=4)]
+#If we already have a list of Vectors, we can also sort it in place using the same key:
+
+vectors = [Vector(3, 4), Vector(1, 1)]
+vectors.sort(key=Vector.norm_squared)
+vectors
+#[Vector(x=1, y=1), Vector(x=3, y=4)]
+#Let's see how much faster this is for a million vectors:
+
+from timeit import timeit
+from random import randint
+
+vectors = [Vector(randint(-100, 100), randint(-100, 100)) for _ in range(1_000_000)]
+[id(v) for v in sorted(vectors)] == [id(v) for v in Vector.sort_by_magnitude(vectors)]
+#True
+timeit(lambda: sorted(vectors), number=1)
+#9.508905109999887
+timeit(lambda: Vector.sort_by_magnitude(vectors), number=1)
+#0.6006114639999396
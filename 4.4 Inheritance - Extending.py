@@ -365,3 +365,279 @@ s1.calc_interest()
 #'Calc interest on Savings Account with APR = 5.0'
 s2.calc_interest()
 #'Calc interest on Savings Account with APR = 5.0'
+
+# =============================================================================
+# Calculating Interest in Bulk
+# calc_interest works on one account at a time, and only gives us back a formatted string. If we need to run the interest calculation across millions of Account and Savings instances, we want actual numbers instead.
+#
+# Since the rate only depends on type(a).apr, batch_interest:
+# - looks up the rate once per class (not once per account)
+# - builds the balances and the rates as two columns, and multiplies them pairwise using map with operator.mul
+# - can split the columns into chunks and send them to a ProcessPoolExecutor, so several CPU cores share the work
+#
+# The result is an array('d') with the (annual) interest amount for each account, in the same order as the accounts we passed in.
+#
+# With max_workers=1 (the default) everything is computed in the current process. Any other value is passed on to the ProcessPoolExecutor - including None, which (just like for the executor itself) means one worker process per CPU.
+#
+# Don't expect this to be faster than a plain list comprehension though - as we'll see below, it isn't.
+#
+# (Note that the worker processes need to be able to find _interest_chunk - this works in a notebook on Linux, where worker processes are forked, but on Windows and macOS the function has to live in an importable module.)
+# =============================================================================
+
+from array import array
+from concurrent.futures import ProcessPoolExecutor
+from itertools import islice
+from operator import attrgetter, mul
+
+def _interest_chunk(balances, rates):
+    return array('d', map(mul, balances, rates))
+
+def batch_interest(accounts, chunk_size=1_000_000, max_workers=1):
+    accounts = accounts if isinstance(accounts, list) else list(accounts)
+    # look up the rate once per class
+    rate_by_class = {cls: float(cls.apr) / 100 for cls in set(map(type, accounts))}
+    balances = map(attrgetter('balance'), accounts)
+    rates = map(rate_by_class.__getitem__, map(type, accounts))
+    if max_workers == 1:
+        return _interest_chunk(balances, rates)
+
+    # arrays are compact to send to the worker processes (they pickle as raw bytes)
+    n_chunks = -(-len(accounts) // chunk_size)
+    balance_chunks = (array('d', islice(balances, chunk_size)) for _ in range(n_chunks))
+    rate_chunks = (array('d', islice(rates, chunk_size)) for _ in range(n_chunks))
+    result = array('d')
+    with ProcessPoolExecutor(max_workers=max_workers) as executor:
+        for amounts in executor.map(_interest_chunk, balance_chunks, rate_chunks):
+            result.extend(amounts)
+    return result
+
+accounts = [Account(100, 1000), Savings(101, 1000), Account(102, 50), Savings(103, 200)]
+batch_interest(accounts)
+#array('d', [30.0, 50.0, 1.5, 10.0])
+#Just like calc_interest, the rate comes from type(a).apr, so instance attributes shadowing apr are ignored:
+
+accounts[1].apr = 10
+batch_interest(accounts)
+#array('d', [30.0, 50.0, 1.5, 10.0])
+#Let's try it with 2 million accounts, first in a single process, and then split into chunks of 250,000 balances across 4 worker processes, and compare that to computing the interest one account at a time:
+
+from random import uniform
+from timeit import timeit
+
+book = [(Account if i % 3 else Savings)(i, uniform(0, 10_000)) for i in range(2_000_000)]
+batch_interest(book) == batch_interest(book, chunk_size=250_000, max_workers=4)
+#True
+timeit(lambda: [a.balance * type(a).apr / 100 for a in book], number=1)
+#0.3138743029999205
+timeit(lambda: batch_interest(book), number=1)
+#0.41956900800005315
+timeit(lambda: batch_interest(book, chunk_size=250_000, max_workers=4), number=1)
+#1.1277733900001294
+# =============================================================================
+# Neither version beats the simple list comprehension - and on this (single core) machine the process pool only adds overhead. That's because almost all of the time is spent walking over the Account objects to read their balance and type - the multiplication itself is the cheap part, and collecting the balances can only happen in the parent process.
+# 
+# So batch_interest is not a speed up: what we get is a compact numeric column instead of a list of strings, and a way to spread the work over several cores (which only pays off when the per-chunk calculation is a lot more expensive than a single multiplication). To actually go faster, the balances have to be stored in a compact column in the first place, instead of being spread over millions of instance dictionaries.
+# =============================================================================
+
+# =============================================================================
+# A Columnar Account Ledger
+# As we just saw, the real cost of working with millions of accounts is the objects themselves: every Account instance carries its own __dict__, holding an account_number, a balance and an account_type string (the same string, repeated over and over in every instance).
+#
+# Instead of storing one object per account, we can store the accounts column by column:
+# - the account numbers in an array('q') (64 bit integers)
+# - the balances in an array('d') (64 bit floats)
+# - the account type as a small integer code in an array('B') (one byte per account), with a separate (tiny) table mapping each code to the account class and its account_type string
+#
+# Of course, a lot of code expects to work with Account objects - reading a.balance, or calling a.calc_interest(). So the ledger hands out lightweight view objects on demand: a view only stores a reference to the ledger and a row index, and its account_number, balance and account_type properties read (and write) straight from the columns.
+#
+# To keep calc_interest (and anything else defined in the Account classes) working, the ledger creates one view class per account class, that inherits from both the view base class and the account class. That way isinstance(view, Savings) is True, and type(view).apr finds the (current) apr of the Savings class, just like calc_interest expects.
+#
+# Since Account does not define __slots__, the view classes still get a __dict__ (Python only creates it when something is actually stored in it). A view is temporary though - the ledger creates a new one every time we index it - so anything stored in that __dict__ (a.apr = 10, or a typo such as a.balence = 10) would silently get lost. So views only allow setting attributes that are backed by a data descriptor (the balance property, and the _ledger and _index slots) - anything else raises an AttributeError.
+#
+# Slicing a ledger returns a list of views.
+# =============================================================================
+
+from array import array
+from operator import mul
+
+class _AccountView:
+    __slots__ = ('_ledger', '_index')
+
+    def __setattr__(self, name, value):
+        if not hasattr(type(getattr(type(self), name, None)), '__set__'):
+            raise AttributeError(f"'{type(self).__name__}' object attribute '{name}' cannot be set "
+                                 f"- only the ledger's columns can be written")
+        object.__setattr__(self, name, value)
+
+    @property
+    def account_number(self):
+        return self._ledger._numbers[self._index]
+
+    @property
+    def balance(self):
+        return self._ledger._balances[self._index]
+
+    @balance.setter
+    def balance(self, value):
+        self._ledger._balances[self._index] = value
+
+    @property
+    def account_type(self):
+        return self._ledger._account_types[self._ledger._type_codes[self._index]]
+
+    def __repr__(self):
+        return f'{type(self).__name__}({self.account_number}, {self.balance})'
+
+class AccountLedger:
+    def __init__(self):
+        self._numbers = array('q')
+        self._balances = array('d')
+        self._type_codes = array('B')
+        # code -> view class and code -> account_type string, and account class -> code
+        self._view_classes = []
+        self._account_types = []
+        self._codes = {}
+
+    @classmethod
+    def from_accounts(cls, accounts):
+        ledger = cls()
+        for account in accounts:
+            ledger.append(account)
+        return ledger
+
+    def _code_for(self, account):
+        account_class = type(account)
+        if issubclass(account_class, _AccountView):
+            # a view (from this ledger or another one) - use the account class it was made for
+            account_class = account_class.__mro__[2]
+        code = self._codes.get(account_class)
+        if code is None:
+            if len(self._view_classes) == 256:
+                raise ValueError('An AccountLedger can hold at most 256 different account classes.')
+            code = len(self._view_classes)
+            view_class = type(f'{account_class.__name__}View', (_AccountView, account_class), {})
+            self._view_classes.append(view_class)
+            # we assume the account_type is the same for all instances of a class (it is set in __init__)
+            self._account_types.append(account.account_type)
+            self._codes[account_class] = code
+        return code
+
+    def append(self, account):
+        # convert (and validate) all the values first - if one of them can't be stored, none of
+        # the columns must change, or they would no longer line up
+        number = array('q', [account.account_number])
+        balance = array('d', [account.balance])
+        code = self._code_for(account)
+        self._numbers.extend(number)
+        self._balances.extend(balance)
+        self._type_codes.append(code)
+        return self[len(self) - 1]
+
+    def __len__(self):
+        return len(self._balances)
+
+    def __getitem__(self, index):
+        if isinstance(index, slice):
+            return [self[i] for i in range(*index.indices(len(self)))]
+        if index < 0:
+            index += len(self)
+        if not 0 <= index < len(self):
+            raise IndexError('AccountLedger index out of range')
+        view = object.__new__(self._view_classes[self._type_codes[index]])
+        view._ledger = self
+        view._index = index
+        return view
+
+    def __iter__(self):
+        return (self[i] for i in range(len(self)))
+
+    @property
+    def balances(self):
+        return self._balances
+
+    def interest(self):
+        # the annual interest of every account, computed column by column
+        rates = [float(view_class.apr) / 100 for view_class in self._view_classes]
+        return array('d', map(mul, self._balances, map(rates.__getitem__, self._type_codes)))
+
+ledger = AccountLedger.from_accounts([Account(100, 1000), Savings(101, 200), Account(102, 50)])
+len(ledger)
+#3
+a = ledger[1]
+a
+#SavingsView(101, 200.0)
+a.account_number, a.balance, a.account_type
+#(101, 200.0, 'Savings Account')
+a.calc_interest()
+#'Calc interest on Savings Account with APR = 5.0'
+isinstance(a, Savings), isinstance(a, Account)
+#(True, True)
+#Writing to a view writes to the ledger's columns:
+
+a.balance += 100
+ledger.balances
+#array('d', [1000.0, 300.0, 50.0])
+#But any attribute that is not stored in the ledger can't be set (it would only end up in this temporary view):
+
+try:
+    a.apr = 10
+except AttributeError as ex:
+    print(ex)
+#'SavingsView' object attribute 'apr' cannot be set - only the ledger's columns can be written
+try:
+    a.account_number = 999
+except AttributeError as ex:
+    print(ex)
+#property 'account_number' of 'SavingsView' object has no setter
+#Slicing returns a list of views:
+
+ledger[1:], ledger[::-2]
+#([SavingsView(101, 300.0), AccountView(102, 50.0)], [AccountView(102, 50.0), AccountView(100, 1000.0)])
+#Views can be appended to a ledger (or used to build a new one) just like the accounts themselves:
+
+ledger_2 = AccountLedger.from_accounts(ledger)
+ledger_2.append(ledger[0])
+#AccountView(100, 1000.0)
+list(ledger_2)
+#[AccountView(100, 1000.0), SavingsView(101, 300.0), AccountView(102, 50.0), AccountView(100, 1000.0)]
+#And an account that can't be stored (an account number that does not fit in 64 bits) leaves the ledger unchanged:
+
+try:
+    ledger_2.append(Account(2 ** 63, 1))
+except OverflowError as ex:
+    print(ex)
+len(ledger_2), len(ledger_2._numbers), len(ledger_2._balances), len(ledger_2._type_codes)
+#int too big to convert
+#(4, 4, 4, 4)
+#And since the view classes inherit apr from the account classes, a change in apr is picked up immediately:
+
+Savings.apr = 6.0
+a.calc_interest()
+#'Calc interest on Savings Account with APR = 6.0'
+ledger.interest()
+#array('d', [30.0, 18.0, 1.5])
+Savings.apr = 5.0
+#Let's compare the memory used by 1 million Account objects and by a ledger holding the same accounts:
+
+import tracemalloc
+from random import uniform
+
+def measure(build):
+    tracemalloc.start()
+    result = build()
+    size, _ = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return result, size
+
+accounts, accounts_size = measure(lambda: [(Account if i % 3 else Savings)(i, uniform(0, 10_000)) for i in range(1_000_000)])
+ledger, ledger_size = measure(lambda: AccountLedger.from_accounts(accounts))
+print(f'objects: {accounts_size / 1024 ** 2:.1f} MB, ledger: {ledger_size / 1024 ** 2:.1f} MB')
+#objects: 155.5 MB, ledger: 16.6 MB
+#And computing the interest from the columns no longer needs to walk over any objects:
+
+from timeit import timeit
+
+timeit(lambda: batch_interest(accounts), number=1)
+#0.1722770829996989
+timeit(lambda: ledger.interest(), number=1)
+#0.11449385900004927
@@ -184,3 +184,1062 @@ l.name = 'Mumbai'
 l.name
 #'Mumbai'
 #Mainly we use slots when we expect to have many instances of a class and to gain a performance boost (mostly storage, but also attribute lookup speed).
+
+# =============================================================================
+# A Spatial Index for Locations (and 2D Vectors)
+# When we have many thousands of Location objects (or 2D Vectors, like the ones in the rich comparisons notes), the only way to find the nearest ones to some point, or all the ones within some radius, is a linear scan computing the distance to every single object.
+#
+# A k-d tree fixes that: it recursively splits the points in half, alternating between splitting on x (longitude) and on y (latitude). When we search, we can skip entire halves of the tree that are further away than what we've already found, so queries take roughly logarithmic time instead of linear time.
+#
+# Our KDTree:
+# - is bulk built from any iterable of objects (splitting on the median, so the tree starts out balanced)
+# - gets the coordinates of each object using a key function - by default (longitude, latitude) for objects that have those attributes, (x, y) otherwise
+# - supports nearest(point, k) and within(point, radius) queries
+# - supports incremental insert and delete (deleted nodes are just marked as such, and the tree is rebuilt once too many of them pile up - while inserts that make a part of the tree too deep just rebuild that part)
+#
+# Note that distances are plain Euclidean distances between the coordinates (just like abs(v1 - v2) for our Vectors) - for longitude/latitude that's fine for finding neighbours over small areas, but it is not a great circle distance.
+# =============================================================================
+
+from heapq import heappush, heappushpop
+from math import sqrt, inf, log
+
+def _coordinates(obj):
+    if hasattr(obj, 'longitude'):
+        return obj.longitude, obj.latitude
+    return obj.x, obj.y
+
+class _Node:
+    # count is the number of nodes in the subtree rooted here (deleted ones included)
+    __slots__ = 'point', 'item', 'axis', 'left', 'right', 'deleted', 'count'
+
+    def __init__(self, point, item, axis):
+        self.point = point
+        self.item = item
+        self.axis = axis
+        self.left = None
+        self.right = None
+        self.deleted = False
+        self.count = 1
+
+class KDTree:
+    # a subtree is rebuilt when one of its halves holds more than this fraction of its nodes
+    balance = 0.7
+
+    def __init__(self, items=(), key=_coordinates):
+        self._key = key
+        self._build([(key(item), item) for item in items])
+
+    def _build(self, entries):
+        self._size = len(entries)
+        self._deleted = 0
+        self._root = self._build_subtree(entries, 0)
+
+    def _build_subtree(self, entries, axis):
+        if not entries:
+            return None
+        entries.sort(key=lambda entry: entry[0][axis])
+        median = len(entries) // 2
+        point, item = entries[median]
+        node = _Node(point, item, axis)
+        node.count = len(entries)
+        node.left = self._build_subtree(entries[:median], 1 - axis)
+        node.right = self._build_subtree(entries[median + 1:], 1 - axis)
+        return node
+
+    def __len__(self):
+        return self._size
+
+    def __iter__(self):
+        return (node.item for node in self._nodes(self._root))
+
+    def _nodes(self, root):
+        stack = [root] if root else []
+        while stack:
+            node = stack.pop()
+            if not node.deleted:
+                yield node
+            if node.left:
+                stack.append(node.left)
+            if node.right:
+                stack.append(node.right)
+
+    def rebuild(self):
+        self._build([(node.point, node.item) for node in self._nodes(self._root)])
+
+    def insert(self, item):
+        point = self._key(item)
+        self._size += 1
+        new = _Node(point, item, 0)
+        if self._root is None:
+            self._root = new
+            return
+        path = []
+        node = self._root
+        while node is not None:
+            node.count += 1
+            path.append(node)
+            node = node.left if point[node.axis] < node.point[node.axis] else node.right
+        parent = path[-1]
+        new.axis = 1 - parent.axis
+        if point[parent.axis] < parent.point[parent.axis]:
+            parent.left = new
+        else:
+            parent.right = new
+        # inserts can unbalance the tree - once the new node ends up much deeper than it would be in a
+        # balanced tree, there is an ancestor with one half much bigger than the other (the "scapegoat"),
+        # and rebuilding just that subtree keeps inserts O(log n) amortized, whatever order they come in
+        if len(path) + 1 > log(self._root.count) / log(1 / self.balance) + 1:
+            self._rebuild_scapegoat(path, new)
+
+    def _rebuild_scapegoat(self, path, child):
+        for i in reversed(range(len(path))):
+            node = path[i]
+            if child.count > self.balance * node.count:
+                break
+            child = node
+        entries = [(n.point, n.item) for n in self._nodes(node)]
+        dropped = node.count - len(entries)  # deleted nodes are left out of the rebuilt subtree
+        subtree = self._build_subtree(entries, node.axis)
+        if i == 0:
+            self._root = subtree
+        elif path[i - 1].left is node:
+            path[i - 1].left = subtree
+        else:
+            path[i - 1].right = subtree
+        for ancestor in path[:i]:
+            ancestor.count -= dropped
+        self._deleted -= dropped
+
+    def delete(self, item):
+        # finds the node holding this exact object, and marks it as deleted
+        point = self._key(item)
+        stack = [self._root] if self._root else []
+        while stack:
+            node = stack.pop()
+            if node.item is item and not node.deleted:
+                node.deleted = True
+                self._size -= 1
+                self._deleted += 1
+                if self._deleted > self._size:
+                    self.rebuild()
+                return
+            # equal coordinates can end up on either side after a rebuild, so only prune on strict inequality
+            if node.left and point[node.axis] <= node.point[node.axis]:
+                stack.append(node.left)
+            if node.right and point[node.axis] >= node.point[node.axis]:
+                stack.append(node.right)
+        raise KeyError(item)
+
+    def nearest(self, point, k=1):
+        # returns a list of (distance, item) pairs, closest first
+        if k < 0:
+            raise ValueError(f'k must be a non-negative integer - got {k}.')
+        if k == 0:
+            return []
+        point = self._key(point) if not isinstance(point, tuple) else point
+        x, y = point
+        best = []  # max-heap (using negated squared distances) of the k closest found so far
+        counter = 0  # tie breaker, so the heap never has to compare items
+        stack = [self._root] if self._root else []
+        while stack:
+            node = stack.pop()
+            if node is None:
+                continue
+            worst = -best[0][0] if len(best) == k else inf
+            nx, ny = node.point
+            if not node.deleted:
+                d2 = (nx - x) ** 2 + (ny - y) ** 2
+                if d2 < worst:
+                    counter += 1
+                    entry = (-d2, counter, node.item)
+                    if len(best) < k:
+                        heappush(best, entry)
+                    else:
+                        heappushpop(best, entry)
+                    worst = -best[0][0] if len(best) == k else inf
+            diff = point[node.axis] - node.point[node.axis]
+            near, far = (node.left, node.right) if diff < 0 else (node.right, node.left)
+            # only visit the far side if the splitting line is closer than the worst match we have
+            if far is not None and diff * diff < worst:
+                stack.append(far)
+            stack.append(near)
+        return [(sqrt(-d2), item) for d2, _, item in sorted(best, reverse=True)]
+
+    def within(self, point, radius):
+        # returns a list of all the items within radius of point (in no particular order)
+        point = self._key(point) if not isinstance(point, tuple) else point
+        x, y = point
+        r2 = radius * radius
+        found = []
+        stack = [self._root] if self._root else []
+        while stack:
+            node = stack.pop()
+            nx, ny = node.point
+            if not node.deleted and (nx - x) ** 2 + (ny - y) ** 2 <= r2:
+                found.append(node.item)
+            diff = point[node.axis] - node.point[node.axis]
+            if node.left is not None and diff <= radius:
+                stack.append(node.left)
+            if node.right is not None and diff >= -radius:
+                stack.append(node.right)
+        return found
+
+locations = [
+    Location('Mumbai', 72.8777, 19.0760),
+    Location('Pune', 73.8567, 18.5204),
+    Location('Delhi', 77.1025, 28.7041),
+    Location('Bengaluru', 77.5946, 12.9716),
+    Location('Chennai', 80.2707, 13.0827),
+    Location('Hyderabad', 78.4867, 17.3850),
+]
+index = KDTree(locations)
+len(index)
+#6
+[(round(d, 2), l.name) for d, l in index.nearest((73.0, 19.0), k=3)]
+#[(0.14, 'Mumbai'), (0.98, 'Pune'), (5.72, 'Hyderabad')]
+sorted(l.name for l in index.within((78.0, 15.0), radius=3))
+#['Bengaluru', 'Chennai', 'Hyderabad']
+#We can also query using one of the indexed objects itself, and insert or delete objects incrementally:
+
+index.insert(Location('Nashik', 73.7898, 19.9975))
+[l.name for _, l in index.nearest(locations[0], k=3)]
+#['Mumbai', 'Pune', 'Nashik']
+index.delete(locations[0])
+[l.name for _, l in index.nearest(locations[0], k=2)]
+#['Pune', 'Nashik']
+len(index)
+#6
+#Asking for no neighbours at all just returns an empty list (a negative k is an error):
+
+index.nearest((73.0, 19.0), k=0)
+#[]
+try:
+    index.nearest((73.0, 19.0), k=-1)
+except ValueError as ex:
+    print(ex)
+#k must be a non-negative integer - got -1.
+#Anything with x and y attributes works too, such as the 2D Vector class from the rich comparisons notes - or this slotted Point class:
+
+class Point:
+    __slots__ = ('x', 'y')
+    def __init__(self, x, y):
+        self.x = x
+        self.y = y
+
+    def __repr__(self):
+        return f'Point({self.x}, {self.y})'
+
+points = KDTree(Point(x, y) for x in range(10) for y in range(10))
+points.nearest(Point(2.2, 6.9))
+#[(0.22360679774997896, Point(2, 7))]
+#Let's compare finding the 5 nearest neighbours among 100,000 random locations, against a linear scan:
+
+from timeit import timeit
+from random import uniform
+
+many = [Location(f'loc_{i}', uniform(-180, 180), uniform(-90, 90)) for i in range(100_000)]
+many_index = KDTree(many)
+target = (10.0, 20.0)
+
+def linear_scan(point, k):
+    x, y = point
+    return sorted(((sqrt((l.longitude - x) ** 2 + (l.latitude - y) ** 2), l) for l in many),
+                  key=lambda pair: pair[0])[:k]
+
+[l for _, l in linear_scan(target, 5)] == [l for _, l in many_index.nearest(target, 5)]
+#True
+timeit(lambda: linear_scan(target, 5), number=10)
+#1.4406218399999489
+timeit(lambda: many_index.nearest(target, 5), number=10)
+#0.0018700919999901089
+#Inserting points in sorted order is the worst case for a k-d tree - every new point goes down the same side. Since only the unbalanced subtrees get rebuilt, the tree stays shallow, and doubling the number of inserts roughly doubles the time:
+
+def sorted_inserts(n):
+    tree = KDTree()
+    for i in range(n):
+        tree.insert(Point(i, i))
+    return tree
+
+def depth(node):
+    return 1 + max(depth(node.left), depth(node.right)) if node else 0
+
+depth(sorted_inserts(16_000)._root)
+#27
+timeit(lambda: sorted_inserts(8_000), number=1)
+#0.3067096100003255
+timeit(lambda: sorted_inserts(16_000), number=1)
+#0.7045595580002555
+
+
+# =============================================================================
+# A Column Store for Locations
+# Slots took 10,000 Points from 1,729 KB down to 635 KB - but that's still over 60 bytes per point, for two numbers. With hundreds of millions of Location rows coming out of a database, even slotted objects are too expensive: every Location is an object, holding references to a float object for the longitude, another one for the latitude, and a string for the name (and most of those names are repeated over and over again).
+#
+# Instead, LocationStore keeps the data column by column (a "struct of arrays", rather than an array of structs):
+# - the longitudes and latitudes in two array('d') columns (8 bytes per value, no float objects at all)
+# - the names in an interned string table: every distinct name is stored only once, in a list, and each row just stores the (4 byte) index of its name in that table, in an array('I')
+#
+# Location objects are only created when we access a row (store[i], or iterating over the store) - they are lightweight, temporary, slotted "flyweights", that share their name string with the table. Code that only needs the numbers (like computing a bounding box) can use the columns directly, and never create any objects at all.
+#
+# We can bulk load a store from any iterable of (name, longitude, latitude) rows - and in particular from a DB-API cursor (fetching rows in batches with fetchmany, so we never hold the whole result set in memory), or from a CSV file.
+# =============================================================================
+
+import csv
+from array import array
+
+class LocationStore:
+    def __init__(self, rows=()):
+        self._longitudes = array('d')
+        self._latitudes = array('d')
+        self._name_ids = array('I')
+        self._names = []  # name id -> name
+        self._name_ids_by_name = {}  # name -> name id
+        self.extend(rows)
+
+    @classmethod
+    def from_cursor(cls, cursor, batch_size=10_000):
+        # cursor is a DB-API cursor, that has already executed a query returning (name, longitude, latitude) rows
+        store = cls()
+        while rows := cursor.fetchmany(batch_size):
+            store.extend(rows)
+        return store
+
+    @classmethod
+    def from_csv(cls, f, has_header=True, **fmtparams):
+        reader = csv.reader(f, **fmtparams)
+        if has_header:
+            next(reader, None)
+        store = cls()
+        store.extend((name, float(longitude), float(latitude)) for name, longitude, latitude in reader)
+        return store
+
+    def _name_id(self, name):
+        name_id = self._name_ids_by_name.get(name)
+        if name_id is None:
+            name_id = self._name_ids_by_name[name] = len(self._names)
+            self._names.append(name)
+        return name_id
+
+    def append(self, name, longitude, latitude):
+        # convert everything before touching any column, so a bad row can't leave the columns out of step
+        longitude, latitude = float(longitude), float(latitude)
+        name_id = self._name_id(name)
+        self._name_ids.append(name_id)
+        self._longitudes.append(longitude)
+        self._latitudes.append(latitude)
+
+    def extend(self, rows):
+        # all or nothing: if any row is bad, the store is rolled back to what it was before the call
+        size, name_count = len(self), len(self._names)
+        name_id = self._name_id
+        append_name_id = self._name_ids.append
+        append_longitude = self._longitudes.append
+        append_latitude = self._latitudes.append
+        try:
+            for name, longitude, latitude in rows:
+                longitude, latitude = float(longitude), float(latitude)
+                append_name_id(name_id(name))
+                append_longitude(longitude)
+                append_latitude(latitude)
+        except BaseException:
+            del self._name_ids[size:]
+            del self._longitudes[size:]
+            del self._latitudes[size:]
+            for name in self._names[name_count:]:
+                del self._name_ids_by_name[name]
+            del self._names[name_count:]
+            raise
+
+    def __len__(self):
+        return len(self._longitudes)
+
+    def _location(self, index):
+        location = Location.__new__(Location)
+        location.name = self._names[self._name_ids[index]]
+        location._longitude = self._longitudes[index]
+        location._latitude = self._latitudes[index]
+        return location
+
+    def __getitem__(self, index):
+        if index < 0:
+            index += len(self)
+        if not 0 <= index < len(self):
+            raise IndexError('LocationStore index out of range')
+        return self._location(index)
+
+    def __iter__(self):
+        return map(self._location, range(len(self)))
+
+    @property
+    def longitudes(self):
+        return self._longitudes
+
+    @property
+    def latitudes(self):
+        return self._latitudes
+
+    @property
+    def names(self):
+        # the distinct names
+        return tuple(self._names)
+store = LocationStore([
+    ('Mumbai', 72.8777, 19.0760),
+    ('Pune', 73.8567, 18.5204),
+    ('Mumbai', 72.8777, 19.0760),
+])
+len(store), store.names
+#(3, ('Mumbai', 'Pune'))
+l = store[1]
+type(l), l.name, l.longitude, l.latitude
+#(<class '__main__.Location'>, 'Pune', 73.8567, 18.5204)
+#Every access creates a new (temporary) Location, but the names are shared:
+
+store[0] is store[2], store[0].name is store[2].name
+#(False, True)
+#A row with a missing coordinate (a NULL from the database, say) is rejected before anything is stored - and a bad row in the middle of a batch rolls back the whole batch, so the columns always stay the same length:
+
+try:
+    store.append('Nagpur', 79.0882, None)
+except TypeError as ex:
+    print(ex)
+#float() argument must be a string or a real number, not 'NoneType'
+try:
+    store.extend([('Nagpur', 79.0882, 21.1458), ('Surat', None, 21.1702)])
+except TypeError as ex:
+    print(ex)
+#float() argument must be a string or a real number, not 'NoneType'
+len(store), len(store.longitudes), len(store.latitudes), store.names
+#(3, 3, 3, ('Mumbai', 'Pune'))
+#Loading from a database cursor (here an in-memory SQLite database) or a CSV file:
+
+import io
+import sqlite3
+
+connection = sqlite3.connect(':memory:')
+connection.execute('create table locations (name text, longitude real, latitude real)')
+connection.executemany('insert into locations values (?, ?, ?)',
+                       [('Delhi', 77.1025, 28.7041), ('Chennai', 80.2707, 13.0827)])
+store = LocationStore.from_cursor(connection.execute('select name, longitude, latitude from locations'))
+[(l.name, l.longitude, l.latitude) for l in store]
+#[('Delhi', 77.1025, 28.7041), ('Chennai', 80.2707, 13.0827)]
+f = io.StringIO('name,longitude,latitude\nBengaluru,77.5946,12.9716\nHyderabad,78.4867,17.3850\n')
+[(l.name, l.longitude) for l in LocationStore.from_csv(f)]
+#[('Bengaluru', 77.5946), ('Hyderabad', 78.4867)]
+#Now let's compare the memory used by a million slotted Location objects, and by a store holding the same rows, where the names come from 1,000 different place names:
+
+import tracemalloc
+from random import uniform, randrange
+
+def measure(build):
+    tracemalloc.start()
+    result = build()
+    size, _ = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return result, size
+
+place_names = [f'place_{i}' for i in range(1_000)]
+rows = [(place_names[randrange(1_000)], uniform(-180, 180), uniform(-90, 90)) for _ in range(1_000_000)]
+
+objects, objects_size = measure(lambda: [Location(name, longitude, latitude) for name, longitude, latitude in rows])
+store, store_size = measure(lambda: LocationStore(rows))
+print(f'objects: {objects_size / 1024 ** 2:.1f} MB, store: {store_size / 1024 ** 2:.1f} MB')
+#objects: 61.5 MB, store: 19.6 MB
+#(The Location objects don't even include the float objects here, since they are shared with the rows - a million Locations loaded from a database would need another 2 x 24 MB for those.)
+
+#And computing something like a bounding box straight from the columns is much faster than going through the objects:
+
+from timeit import timeit
+
+timeit(lambda: (min(l.longitude for l in objects), max(l.longitude for l in objects)), number=1)
+#0.23652398700005506
+timeit(lambda: (min(store.longitudes), max(store.longitudes)), number=1)
+#0.0635072529998979
+
+
+# =============================================================================
+# Memory Mapped Location Files
+# A LocationStore is compact, but it still has to be loaded (from the database, or a CSV file) every time a process starts - and every worker process we start loads (and holds) its own copy.
+#
+# If we save the locations in a binary file with a fixed layout, we can memory map the file (mmap) instead of reading it: opening the file then takes the same (tiny) amount of time however big it is, the operating system only reads the pages of the file we actually touch, and since the pages are mapped read-only, every process that maps the same file shares the same physical memory.
+#
+# The file layout (all little-endian):
+# - a header: a magic string, a format version, the number of locations and the number of distinct names
+# - the location records: one fixed-width record per location, holding its longitude and latitude (doubles) and the id of its name (an unsigned int, padded to 24 bytes) - so record i is at a known offset, and we can read it with struct.unpack_from
+# - the name offsets: for each name id, the offset of the name in the heap (plus one final offset marking the end of the heap)
+# - the name heap: all the distinct names, UTF-8 encoded, one after the other
+#
+# Just like the views in the AccountLedger, the MappedLocation views inherit from Location (so isinstance works, and anything else defined in Location is available), but only store a reference to the mapped file and a record index - name, longitude and latitude are read straight from the mapped buffer. Names are decoded the first time they are needed, and then cached.
+# =============================================================================
+
+import mmap
+import struct
+
+_LOCATIONS_HEADER = struct.Struct('<8sIQQ')  # magic, version, location count, name count
+_LOCATION_RECORD = struct.Struct('<ddI4x')  # longitude, latitude, name id
+_NAME_OFFSET = struct.Struct('<Q')
+_LOCATIONS_MAGIC = b'LOCATION'
+_LOCATIONS_VERSION = 1
+
+def write_locations(path, locations):
+    # locations is any iterable of Location objects (or a LocationStore)
+    name_ids = {}
+    with open(path, 'wb') as f:
+        f.write(_LOCATIONS_HEADER.pack(_LOCATIONS_MAGIC, _LOCATIONS_VERSION, 0, 0))
+        count = 0
+        for location in locations:
+            name_id = name_ids.setdefault(location.name, len(name_ids))
+            f.write(_LOCATION_RECORD.pack(location.longitude, location.latitude, name_id))
+            count += 1
+
+        encoded_names = [name.encode('utf-8') for name in name_ids]  # in name id order
+        offset = 0
+        for encoded_name in encoded_names:
+            f.write(_NAME_OFFSET.pack(offset))
+            offset += len(encoded_name)
+        f.write(_NAME_OFFSET.pack(offset))
+        for encoded_name in encoded_names:
+            f.write(encoded_name)
+
+        # now that we know the counts, go back and fill them in
+        f.seek(0)
+        f.write(_LOCATIONS_HEADER.pack(_LOCATIONS_MAGIC, _LOCATIONS_VERSION, count, len(name_ids)))
+
+class MappedLocation(Location):
+    __slots__ = ('_mapped', '_index')
+
+    @property
+    def name(self):
+        return self._mapped._name(self._index)
+
+    @property
+    def longitude(self):
+        return self._mapped._record(self._index)[0]
+
+    @property
+    def latitude(self):
+        return self._mapped._record(self._index)[1]
+
+    def __repr__(self):
+        return f'MappedLocation({self.name!r}, {self.longitude}, {self.latitude})'
+
+class MappedLocations:
+    def __init__(self, path):
+        with open(path, 'rb') as f:
+            self._buffer = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        magic, version, self._count, self._name_count = _LOCATIONS_HEADER.unpack_from(self._buffer)
+        if magic != _LOCATIONS_MAGIC or version != _LOCATIONS_VERSION:
+            self._buffer.close()
+            raise ValueError(f'{path} is not a version {_LOCATIONS_VERSION} locations file.')
+        self._names_offset = _LOCATIONS_HEADER.size + self._count * _LOCATION_RECORD.size
+        self._heap_offset = self._names_offset + (self._name_count + 1) * _NAME_OFFSET.size
+        self._names = {}  # name id -> decoded name
+
+    def close(self):
+        self._buffer.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, exc_tb):
+        self.close()
+        return False
+
+    def __len__(self):
+        return self._count
+
+    def _record(self, index):
+        return _LOCATION_RECORD.unpack_from(self._buffer, _LOCATIONS_HEADER.size + index * _LOCATION_RECORD.size)
+
+    def _name(self, index):
+        name_id = self._record(index)[2]
+        name = self._names.get(name_id)
+        if name is None:
+            start, end = struct.unpack_from('<QQ', self._buffer, self._names_offset + name_id * _NAME_OFFSET.size)
+            name = self._names[name_id] = str(self._buffer[self._heap_offset + start:self._heap_offset + end], 'utf-8')
+        return name
+
+    def _location(self, index):
+        location = MappedLocation.__new__(MappedLocation)
+        location._mapped = self
+        location._index = index
+        return location
+
+    def __getitem__(self, index):
+        if index < 0:
+            index += len(self)
+        if not 0 <= index < len(self):
+            raise IndexError('MappedLocations index out of range')
+        return self._location(index)
+
+    def __iter__(self):
+        return map(self._location, range(len(self)))
+
+    def records(self):
+        # iterates over (longitude, latitude, name id) tuples, without creating any views
+        return _LOCATION_RECORD.iter_unpack(
+            memoryview(self._buffer)[_LOCATIONS_HEADER.size:self._names_offset]
+        )
+#Let's write a few locations to a file, and map it:
+
+import os
+import tempfile
+
+# removed (with everything in it) by cleanup(), once we are done
+temp_dir = tempfile.TemporaryDirectory()
+directory = temp_dir.name
+path = os.path.join(directory, 'cities.loc')
+write_locations(path, [
+    Location('Mumbai', 72.8777, 19.0760),
+    Location('Pune', 73.8567, 18.5204),
+    Location('Mumbai', 72.8777, 19.0760),
+    Location('Zürich', 8.5417, 47.3769),
+])
+os.path.getsize(path)
+#173
+cities = MappedLocations(path)
+len(cities), cities[1], cities[-1]
+#(4, MappedLocation('Pune', 73.8567, 18.5204), MappedLocation('Zürich', 8.5417, 47.3769))
+isinstance(cities[0], Location), cities[0].name is cities[2].name
+#(True, True)
+#The views are read-only, since they read straight from a read-only mapping:
+
+try:
+    cities[0].name = 'Bombay'
+except AttributeError as ex:
+    print(ex)
+#property 'name' of 'MappedLocation' object has no setter
+#Now let's save the million locations from the LocationStore we built earlier, and compare how long it takes to open the file (and read a location) with how long it takes to load the same data from a pickle:
+
+import pickle
+from time import perf_counter
+
+big_path = os.path.join(directory, 'big.loc')
+write_locations(big_path, store)
+rows_path = os.path.join(directory, 'big.pickle')
+with open(rows_path, 'wb') as f:
+    pickle.dump(rows, f)
+
+start = perf_counter()
+with open(rows_path, 'rb') as f:
+    loaded = LocationStore(pickle.load(f))
+print(f'unpickle: {perf_counter() - start:.3f} secs')
+start = perf_counter()
+mapped = MappedLocations(big_path)
+location = mapped[500_000]
+print(f'mmap: {perf_counter() - start:.6f} secs')
+#unpickle: 0.493 secs
+#mmap: 0.000187 secs
+(location.name, location.longitude) == (store[500_000].name, store[500_000].longitude)
+#True
+#Opening the mapped file does not depend on its size at all - only the pages we actually read are loaded (and any other process mapping the same file shares them). We can still scan all the records when we need to, without creating any views:
+
+min(longitude for longitude, _, _ in mapped.records()) == min(store.longitudes)
+#True
+#Once we're done, we close the mappings (the files can't be removed on Windows while they are mapped), and remove the temporary directory:
+
+mapped.close()
+cities.close()
+temp_dir.cleanup()
+
+
+# =============================================================================
+# Benchmarking Object Memory and Attribute Access
+# The numbers quoted at the top of these notes (1,729 KB vs 635 KB for 10,000 Points, and about 30% faster attribute access with slots) depend on the Python version (key sharing dictionaries, for example, have changed quite a bit since Python 3.3) - so rather than just quoting them, let's write a small benchmark suite we can re-run on any version of Python.
+#
+# For each kind of object, and each number of instances (10^3 up to 10^7 by default), it measures:
+# - the memory used per instance (with tracemalloc - only the instances themselves, the attribute values are shared)
+# - the construction cost (ns per instance)
+# - the cost of getting, setting and deleting an attribute (ns per operation)
+#
+# The objects we compare are:
+# - PersonDict and PersonSlots from the slides (a single name attribute, set after creation)
+# - Point, with and without slots (a regular class whose instances all get the same attributes in __init__ - so they use key sharing dictionaries)
+# - our slotted Location
+# - plain dictionaries, as the dict-backed equivalent of Point
+#
+# The attribute operations use C level loops (map, consumed by a zero length deque) so the loop itself adds as little overhead as possible to what we're measuring. The results come back as a JSON-serializable dictionary (along with the Python version and platform), so we can save them and compare runs across Python versions.
+# =============================================================================
+
+import gc
+import json
+import operator
+import platform
+import sys
+import tracemalloc
+from collections import deque, namedtuple
+from itertools import repeat
+from time import perf_counter_ns
+
+class PersonDict:
+    pass
+
+class PersonSlots:
+    __slots__ = ('name', )
+
+class PointDict:
+    def __init__(self, x, y):
+        self.x = x
+        self.y = y
+
+class PointSlots:
+    __slots__ = ('x', 'y')
+    def __init__(self, x, y):
+        self.x = x
+        self.y = y
+
+def _person(cls):
+    def factory():
+        p = cls()
+        p.name = 'John'
+        return p
+    return factory
+
+BenchmarkCase = namedtuple('BenchmarkCase', 'name factory attribute get set delete')
+
+_attribute_ops = (operator.attrgetter, setattr, delattr)
+_item_ops = (operator.itemgetter, operator.setitem, operator.delitem)
+
+BENCHMARK_CASES = (
+    BenchmarkCase('PersonDict', _person(PersonDict), 'name', *_attribute_ops),
+    BenchmarkCase('PersonSlots', _person(PersonSlots), 'name', *_attribute_ops),
+    BenchmarkCase('PointDict', lambda: PointDict(0.0, 0.0), 'x', *_attribute_ops),
+    BenchmarkCase('PointSlots', lambda: PointSlots(0.0, 0.0), 'x', *_attribute_ops),
+    BenchmarkCase('Location', lambda: Location('Mumbai', 72.8777, 19.0760), 'name', *_attribute_ops),
+    BenchmarkCase('dict', lambda: {'x': 0.0, 'y': 0.0}, 'x', *_item_ops),
+)
+
+def _ns_per_item(func, n):
+    start = perf_counter_ns()
+    func()
+    return (perf_counter_ns() - start) / n
+
+def _build(factory, n):
+    instances = [None] * n
+    for i in range(n):
+        instances[i] = factory()
+    return instances
+
+def benchmark_case(case, n):
+    gc.collect()
+    gc.disable()
+    try:
+        # tracemalloc slows down allocations a lot, so we time the construction separately
+        start = perf_counter_ns()
+        instances = _build(case.factory, n)
+        construct_ns = (perf_counter_ns() - start) / n
+        del instances
+
+        tracemalloc.start()
+        instances = _build(case.factory, n)
+        size, _ = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+        # (less the list holding them)
+        size -= sys.getsizeof(instances)
+
+        attribute = case.attribute
+        get = case.get(attribute)
+        value = get(instances[0])
+        exhaust = deque(maxlen=0).extend
+        get_ns = _ns_per_item(lambda: exhaust(map(get, instances)), n)
+        set_ns = _ns_per_item(lambda: exhaust(map(case.set, instances, repeat(attribute), repeat(value))), n)
+        # deleting has to come last (the attribute is gone afterwards)
+        del_ns = _ns_per_item(lambda: exhaust(map(case.delete, instances, repeat(attribute))), n)
+    finally:
+        gc.enable()
+    return {
+        'case': case.name,
+        'instances': n,
+        'bytes_per_instance': round(size / n, 1),
+        'construct_ns': round(construct_ns, 1),
+        'get_ns': round(get_ns, 1),
+        'set_ns': round(set_ns, 1),
+        'del_ns': round(del_ns, 1),
+    }
+
+def run_benchmarks(sizes=tuple(10 ** k for k in range(3, 8)), cases=BENCHMARK_CASES):
+    return {
+        'python': sys.version,
+        'implementation': platform.python_implementation(),
+        'platform': platform.platform(),
+        'results': [benchmark_case(case, n) for n in sizes for case in cases],
+    }
+#Running the whole suite (up to 10 million instances of each kind) takes a while, and a few GB of memory - so let's just run it here up to 100,000 instances, and print the results for the largest size:
+
+results = run_benchmarks(sizes=(1_000, 10_000, 100_000))
+print(f'{"case":>12} {"bytes":>7} {"construct":>10} {"get":>6} {"set":>6} {"del":>6}')
+for result in results['results']:
+    if result['instances'] == 100_000:
+        print(f'{result["case"]:>12} {result["bytes_per_instance"]:7.1f} {result["construct_ns"]:8.1f}ns '
+              f'{result["get_ns"]:4.1f}ns {result["set_ns"]:4.1f}ns {result["del_ns"]:4.1f}ns')
+#        case   bytes  construct    get    set    del
+#  PersonDict    80.0    152.8ns 27.0ns 34.0ns 35.3ns
+# PersonSlots    40.0    100.8ns 26.8ns 33.2ns 31.0ns
+#   PointDict    88.0    215.1ns 31.0ns 34.4ns 32.8ns
+#  PointSlots    48.0    221.5ns 27.2ns 36.0ns 32.2ns
+#    Location    56.0    300.7ns 27.0ns 36.9ns 31.7ns
+#        dict   183.9    205.5ns 42.4ns 41.0ns 31.9ns
+#These are from Python 3.11 - and the gap is quite a bit smaller than the numbers in the slides (10,000 PointDict instances now take about 880 KB, versus 480 KB with slots). Since Python 3.11, the attribute values of regular instances are stored inline, and the instance dictionary only gets created if we ask for __dict__ - so slots still use half the memory, but attribute access is about the same speed (and the timings vary quite a bit from run to run). A plain dictionary is by far the most expensive option.
+
+#And we can save the results as JSON, to compare them with runs on other versions of Python:
+
+import os
+import tempfile
+
+with tempfile.TemporaryDirectory() as directory:
+    results_path = os.path.join(directory, f'object_memory_{platform.python_version()}.json')
+    with open(results_path, 'w') as f:
+        json.dump(results, f, indent=2)
+    with open(results_path) as f:
+        saved = json.load(f)
+saved['python'], saved['results'][0]
+#('3.11.7 (main, Oct  2 2025, 21:14:28) [GCC 12.2.0]',
+# {'case': 'PersonDict', 'instances': 1000, 'bytes_per_instance': 79.9, 'construct_ns': 162.8, 'get_ns': 29.1, 'set_ns': 37.1, 'del_ns': 33.0})
+
+
+# =============================================================================
+# Deriving Slots Automatically
+# Lots of classes only ever set a fixed set of attributes on their instances - Point, Person, Vector, Circle, Account - and could use slots, but writing (and maintaining!) the __slots__ by hand is tedious and error prone: forget one attribute, and the class breaks the first time some code path sets it.
+#
+# Since the attributes are just the self.<name> = ... assignments in the methods of the class, we can find them automatically. The slotted class decorator:
+# - parses the source code of every method of the class (not just __init__ - an attribute first set in some other method would fail otherwise), including property getters and setters, and collects every attribute stored through the first parameter - not only in assignments (self.x = ..., self.x += ..., self.x, self.y = ...), but anywhere Python can store to an attribute (for self.x in ..., with ... as self.x, and so on). Lambdas are skipped - they can't contain assignments
+# - leaves out the names that are data descriptors (properties) in the class: self.radius = value in __init__ goes through the radius property, and the property setter stores the value in self._radius - so it's _radius that needs a slot (and a slot named radius would actually conflict with the property)
+# - leaves out the attributes that already have a slot in a base class (say, set by super().__init__ in a slotted parent) - and refuses to decorate a class whose bases are not slotted themselves, since their instances would get a __dict__ anyway
+# - rebuilds the class with the same name, bases and namespace, plus the __slots__ (we can't add slots to a class after it has been created)
+#
+# Methods that use super() without arguments have a reference to the class they were defined in (a closure cell called __class__) - which would still point to the original class. So the new class gets copies of those methods, whose __class__ cell points to the new class instead (the original class keeps the original methods, and keeps working).
+#
+# Finally, memory_saved creates instances of both versions of the class (the decorated class keeps a reference to the original one in __unslotted__) and reports how much memory slots save per instance. Since Python 3.11, regular instances only get an actual __dict__ once some code asks for it - so the memory used by the regular instances is reported twice: as they are after just being created, and after their __dict__ has been materialized (which is what they cost on older versions of Python, or once anything touches __dict__, such as vars() or copy). The saving is computed from the first figure.
+# =============================================================================
+
+import ast
+import inspect
+import textwrap
+import tracemalloc
+from types import CellType, FunctionType
+
+def _functions(namespace):
+    for value in namespace.values():
+        if isinstance(value, (classmethod, staticmethod)):
+            continue
+        if isinstance(value, property):
+            yield from (f for f in (value.fget, value.fset, value.fdel) if f is not None)
+        elif inspect.isfunction(value):
+            yield value
+
+def _assigned_attributes(func):
+    if func.__name__ == '<lambda>':
+        # a lambda is a single expression - it can't assign to an attribute
+        return set()
+    try:
+        source = textwrap.dedent(inspect.getsource(func))
+    except (OSError, TypeError):
+        raise TypeError(f'slotted needs the source code of {func.__qualname__}') from None
+    node = ast.parse(source).body[0]
+    if not isinstance(node, (ast.FunctionDef, ast.AsyncFunctionDef)) or not node.args.args:
+        return set()
+    self_name = node.args.args[0].arg
+    # every self.<name> that gets stored to - whatever the statement doing the storing
+    return {
+        target.attr for target in ast.walk(node)
+        if isinstance(target, ast.Attribute) and isinstance(target.ctx, ast.Store)
+        and isinstance(target.value, ast.Name) and target.value.id == self_name
+    }
+
+def _mangle(name, class_name):
+    # self.__x inside class C is really self._C__x
+    if name.startswith('__') and not name.endswith('__'):
+        return f'_{class_name.lstrip("_")}{name}'
+    return name
+
+def _slots(cls):
+    slots = cls.__dict__.get('__slots__', ())
+    return (slots, ) if isinstance(slots, str) else slots
+
+def _rebind(func, old_cls, new_cls):
+    # returns a copy of func whose __class__ cell (used by super()) points to new_cls
+    if '__class__' not in func.__code__.co_freevars:
+        return func
+    closure = tuple(
+        CellType(new_cls) if name == '__class__' and cell.cell_contents is old_cls else cell
+        for name, cell in zip(func.__code__.co_freevars, func.__closure__)
+    )
+    new_func = FunctionType(func.__code__, func.__globals__, func.__name__, func.__defaults__, closure)
+    new_func.__kwdefaults__ = func.__kwdefaults__
+    new_func.__qualname__ = func.__qualname__
+    new_func.__doc__ = func.__doc__
+    new_func.__annotations__ = func.__annotations__
+    new_func.__dict__.update(func.__dict__)
+    return new_func
+
+def _rebind_attribute(value, old_cls, new_cls):
+    if isinstance(value, (classmethod, staticmethod)):
+        return type(value)(_rebind(value.__func__, old_cls, new_cls))
+    if isinstance(value, property):
+        fget, fset, fdel = (f and _rebind(f, old_cls, new_cls) for f in (value.fget, value.fset, value.fdel))
+        return type(value)(fget, fset, fdel, value.__doc__)
+    if inspect.isfunction(value):
+        return _rebind(value, old_cls, new_cls)
+    return value
+
+def slotted(cls=None, *, weakref=False):
+    if cls is None:
+        # called with arguments: @slotted(weakref=True)
+        return lambda cls: slotted(cls, weakref=weakref)
+    if '__slots__' in cls.__dict__:
+        raise TypeError(f'{cls.__name__} already defines __slots__')
+    for base in cls.__mro__[1:-1]:
+        if '__slots__' not in base.__dict__:
+            raise TypeError(f'{cls.__name__} inherits from {base.__name__}, which is not slotted '
+                            f'(decorate {base.__name__} with slotted too)')
+
+    inherited = {_mangle(name, base.__name__) for base in cls.__mro__[1:] for name in _slots(base)}
+    names = set()
+    for func in _functions(cls.__dict__):
+        names.update(_mangle(name, cls.__name__) for name in _assigned_attributes(func))
+
+    slots = []
+    for name in sorted(names - inherited):
+        class_attribute = inspect.getattr_static(cls, name, None)
+        if hasattr(class_attribute, '__set__'):
+            # a property (or other data descriptor) - it stores the value somewhere else
+            continue
+        if name in cls.__dict__:
+            raise TypeError(f'{cls.__name__}.{name} is both a class attribute and an instance attribute, '
+                            f'which slots do not support')
+        slots.append(name)
+    if weakref and '__weakref__' not in inherited:
+        slots.append('__weakref__')
+
+    namespace = {key: value for key, value in cls.__dict__.items() if key not in ('__dict__', '__weakref__')}
+    namespace['__slots__'] = tuple(slots)
+    new_cls = type(cls)(cls.__name__, cls.__bases__, namespace)
+    new_cls.__qualname__ = cls.__qualname__
+    new_cls.__unslotted__ = cls
+    # the original class keeps its own methods, so it still works too
+    for key, value in namespace.items():
+        rebound = _rebind_attribute(value, cls, new_cls)
+        if rebound is not value:
+            setattr(new_cls, key, rebound)
+    return new_cls
+
+def memory_saved(slotted_cls, *args, n=10_000, **kwargs):
+    # returns the memory used per instance (in bytes): without slots (as created, and with
+    # the instance dictionaries materialized), and with slots
+    tracemalloc.start()
+    instances = [slotted_cls.__unslotted__(*args, **kwargs) for _ in range(n)]
+    dict_size, _ = tracemalloc.get_traced_memory()
+    for instance in instances:
+        instance.__dict__
+    materialized_size, _ = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    del instances
+
+    tracemalloc.start()
+    instances = [slotted_cls(*args, **kwargs) for _ in range(n)]
+    slots_size, _ = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    del instances
+    return {
+        'dict': round(dict_size / n, 1),
+        'dict_materialized': round(materialized_size / n, 1),
+        'slots': round(slots_size / n, 1),
+        'saved': round((dict_size - slots_size) / n, 1),
+    }
+#Let's start with the Circle class from the computed properties notes - its __init__ sets radius (a property) and _area, and the radius setter sets _radius:
+
+from math import pi
+
+@slotted
+class Circle:
+    def __init__(self, radius):
+        self.radius = radius
+        self._area = None
+
+    @property
+    def radius(self):
+        return self._radius
+
+    @radius.setter
+    def radius(self, value):
+        self._area = None
+        self._radius = value
+
+    @property
+    def area(self):
+        if self._area is None:
+            self._area = pi * (self.radius ** 2)
+        return self._area
+Circle.__slots__
+#('_area', '_radius')
+c = Circle(2)
+c.area, hasattr(c, '__dict__')
+#(12.566370614359172, False)
+try:
+    c.colour = 'red'
+except AttributeError as ex:
+    print(ex)
+#'Circle' object has no attribute 'colour'
+#With inheritance, each class only gets slots for the attributes its bases don't already have - and super() still works:
+
+@slotted
+class Person:
+    def __init__(self, name, age):
+        self.name = name
+        self.age = age
+
+@slotted
+class Student(Person):
+    def __init__(self, name, age, school):
+        super().__init__(name, age)
+        self.school = school
+        self.__grades = []
+
+    def add_grade(self, grade):
+        self.__grades += [grade]
+        self.average = sum(self.__grades) / len(self.__grades)
+Person.__slots__, Student.__slots__
+#(('age', 'name'), ('_Student__grades', 'average', 'school'))
+s = Student('Alex', 19, 'MIT')
+s.add_grade(90)
+s.add_grade(80)
+s.name, s.school, s.average
+#('Alex', 'MIT', 85.0)
+#Attributes stored by other statements than assignments are found too, and a property built from a lambda is not a problem:
+
+@slotted
+class Sensor:
+    def __init__(self, readings):
+        for self.latest in readings:
+            pass
+        with open(os.devnull) as self.source:
+            pass
+
+    fahrenheit = property(lambda self: self.latest * 9 / 5 + 32)
+Sensor.__slots__, Sensor([10, 20]).fahrenheit
+#(('latest', 'source'), 68.0)
+#But a base class that is not slotted would give the instances a __dict__ anyway:
+
+class Base:
+    pass
+
+try:
+    @slotted
+    class Derived(Base):
+        def __init__(self):
+            self.x = 0
+except TypeError as ex:
+    print(ex)
+#Derived inherits from Base, which is not slotted (decorate Base with slotted too)
+#And finally, how much memory do we save?
+
+@slotted
+class Point:
+    def __init__(self, x, y):
+        self.x = x
+        self.y = y
+
+memory_saved(Point, 0, 0), memory_saved(Circle, 1), memory_saved(Student, 'Alex', 19, 'MIT')
+#({'dict': 96.8, 'dict_materialized': 160.5, 'slots': 56.5, 'saved': 40.3},
+# {'dict': 96.8, 'dict_materialized': 160.3, 'slots': 56.5, 'saved': 40.3},
+# {'dict': 168.4, 'dict_materialized': 232.4, 'slots': 136.1, 'saved': 32.3})
+#(Python 3.11 - Student instances also include the list of grades each one holds.) On 3.11, as long as nothing asks for __dict__, slots save about 40 bytes per instance - in line with the benchmarks above. Once the instance dictionaries exist (or on versions of Python before 3.11), that goes up to around 100 bytes per instance, just like the numbers for Point at the start of these notes - whether we write the slots by hand, or let slotted work them out for us.